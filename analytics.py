@@ -0,0 +1,94 @@
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+
+# --- PROGRESS ANALYTICS ---
+# Everything is computed with column operations over the event log and the
+# workout history. Reports are memoized on (user, record version, event log
+# token), so a rerun that brings no new data never recomputes a chart.
+STATS = ["Strength", "Intellect", "Vitality", "Agility", "Sense", "Spirit"]
+EVENT_COLUMNS = ["ts", "kind", "source", "xp", "gold", "note"]
+
+def events_frame(log, username):
+    paths = log.partition_paths(username)
+    if not paths:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    frame = pd.concat([pd.read_json(p, lines=True, dtype=False, convert_dates=False) for p in paths], ignore_index=True)
+    frame["ts"] = pd.to_datetime(frame["ts"])
+    return frame.sort_values("ts", kind="stable").reset_index(drop=True)
+
+def xp_by_stat(frame, freq="W"):
+    # Cumulative XP per stat at the end of each period.
+    if frame.empty:
+        return pd.DataFrame(columns=STATS)
+    xp = pd.DataFrame.from_records(frame["xp"].tolist(), index=frame["ts"]).reindex(columns=STATS).fillna(0)
+    return xp.resample(freq).sum().cumsum()
+
+def gold_flow(frame, freq="MS"):
+    if frame.empty:
+        return pd.DataFrame(columns=["Earned", "Spent"])
+    gold = frame.set_index("ts")["gold"].astype("float64")
+    flow = pd.DataFrame({"Earned": gold.clip(lower=0), "Spent": -gold.clip(upper=0)})
+    return flow.resample(freq).sum()
+
+def habit_stats(frame, today=None):
+    # Per habit: days done, completion rate since first done, current and best streak.
+    today = pd.Timestamp(today or datetime.date.today())
+    done = frame.loc[frame["kind"] == "habit", ["source", "ts"]] if not frame.empty else pd.DataFrame(columns=["source", "ts"])
+    if done.empty:
+        return pd.DataFrame(columns=["Habit", "Days Done", "Completion %", "Current Streak", "Best Streak"])
+    days = done.assign(day=done["ts"].dt.normalize()).drop_duplicates(["source", "day"]).sort_values(["source", "day"])
+    # A new run starts wherever the gap to the previous day of the same habit is not exactly one day.
+    gap = days.groupby("source")["day"].diff().dt.days
+    run_id = (gap != 1).cumsum()
+    runs = days.groupby(["source", run_id]).agg(length=("day", "size"), last=("day", "max")).reset_index()
+    per_habit = days.groupby("source").agg(done=("day", "size"), first=("day", "min"))
+    active = runs[runs["last"] >= today - pd.Timedelta(days=1)].groupby("source")["length"].max()
+    span = (today - per_habit["first"]).dt.days + 1
+    return pd.DataFrame({
+        "Habit": per_habit.index,
+        "Days Done": per_habit["done"].to_numpy(),
+        "Completion %": (100 * per_habit["done"] / span.clip(lower=1)).round(1).to_numpy(),
+        "Current Streak": active.reindex(per_habit.index).fillna(0).astype(int).to_numpy(),
+        "Best Streak": runs.groupby("source")["length"].max().reindex(per_habit.index).to_numpy(),
+    })
+
+def _leading_number(series):
+    # "5", "8-10", "45s" -> 5, 8, 45
+    return pd.to_numeric(series.astype(str).str.extract(r"(\d+(?:\.\d+)?)", expand=False), errors="coerce")
+
+def lift_frame(workout_history):
+    if not workout_history:
+        return pd.DataFrame(columns=["date", "exercise", "tonnage", "e1rm"])
+    sets = pd.json_normalize(workout_history, "exercises", ["date"], errors="ignore")
+    weight, reps = _leading_number(sets["my_weight"]), _leading_number(sets["reps"])
+    n_sets = pd.to_numeric(sets.get("sets_completed"), errors="coerce").fillna(_leading_number(sets["sets"]))
+    lifts = pd.DataFrame({
+        "date": pd.to_datetime(sets["date"]),
+        "exercise": sets["name"].str.lower().str.split().str.join(" "),
+        "tonnage": weight * reps * n_sets,
+        "e1rm": weight * (1 + reps / 30),  # Epley
+    }).dropna(subset=["tonnage"])
+    return lifts.groupby(["date", "exercise"], as_index=False).agg(tonnage=("tonnage", "sum"), e1rm=("e1rm", "max"))
+
+def lift_trends(lifts, metric):
+    # date x exercise table for one metric, ready for st.line_chart.
+    if lifts.empty:
+        return pd.DataFrame()
+    return lifts.pivot_table(index="date", columns="exercise", values=metric, aggfunc="max").astype(np.float64)
+
+@functools.lru_cache(maxsize=32)
+def report(store, log, username, version, events_token):
+    # `version` and `events_token` only key the cache; pass the current ones on every call.
+    record = store.load_all().get(username) or {}
+    frame = events_frame(log, username)
+    lifts = lift_frame(record.get("workout_history", []))
+    return {
+        "xp": xp_by_stat(frame),
+        "gold": gold_flow(frame),
+        "habits": habit_stats(frame),
+        "tonnage": lift_trends(lifts, "tonnage"),
+        "e1rm": lift_trends(lifts, "e1rm"),
+    }
@@ -1,15 +1,37 @@
 import streamlit as st
 import datetime
-import json
+import html
 import os
 import pandas as pd
 import time
 import random
 from io import StringIO
+from streamlit.errors import StreamlitAPIException
+import streamlit.components.v1 as components
+import copy
+import storage
+import tasks
+import analytics
+import avatars
+import backup
+import bodyweight
+import events
+import gym
+import guilds
+import inventory
+import metrics
+import rules
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="LifeQuest: Family Guild", page_icon="🛡️", layout="wide")
-SAVE_FILE = "save_data.json"
+GUILDS_DIR = "guilds"  # one shard per household; the original family stays in the working directory
+ASSETS_DIR = "assets"
+# Streamlit serves <app dir>/static at app/static/ when server.enableStaticServing is on (.streamlit/config.toml).
+AVATAR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "avatars")
+AVATAR_URL = "app/static/avatars"
+STORAGE_BACKEND = os.environ.get("LIFEQUEST_STORAGE", "sqlite")  # "sqlite" or "json"
+if os.environ.get("LIFEQUEST_METRICS_PORT"):
+    metrics.start_exporter(int(os.environ["LIFEQUEST_METRICS_PORT"]))
 
 # --- VISUAL STYLING ---
 def local_css():
@@ -77,6 +99,10 @@ RANK_SUFFIXES = {
     "B-Rank": "rank_b", "A-Rank": "rank_a", "S-Rank": "rank_s", "Nation-Level": "rank_nation"
 }
 
+def get_avatars():
+    # Built on the first run in this process; later reruns only do dict lookups.
+    return avatars.open_index(ASSETS_DIR, AVATAR_DIR, ROLE_PREFIXES.values(), RANK_SUFFIXES.values())
+
 RANKS = {
     0: "E-Rank", 1000: "D-Rank", 2500: "C-Rank", 5000: "B-Rank",
     10000: "A-Rank", 20000: "S-Rank", 50000: "Nation-Level"
@@ -142,63 +168,213 @@ DEFAULT_SKILLS = {
 }
 
 # --- DATA PERSISTENCE ---
+def get_guilds():
+    return guilds.open_directory(GUILDS_DIR, {
+        "name": "Family Guild",
+        "members": {name: name for name in FAMILY_TEMPLATES},
+        "templates": FAMILY_TEMPLATES,
+        "skills": DEFAULT_SKILLS,
+    })
+
+def get_guild():
+    # Every shard below belongs to the guild picked at login; idle guilds are closed in LRU order.
+    return get_guilds().open(st.session_state.get("guild", guilds.DEFAULT_GUILD))
+
+def get_store():
+    return get_guild().store(STORAGE_BACKEND)
+
 def load_all_data():
-    if os.path.exists(SAVE_FILE):
-        with open(SAVE_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    return get_store().load_all()
+
+def record_version(username):
+    # The committed version in the shared cache; keys memoized views of a user's data.
+    return (get_store().load_all().get(username) or {}).get(storage.VERSION_KEY, 0)
+
+def get_catalog():
+    return get_guild().catalog()
+
+def template_for(username):
+    return get_guild().template_for(username)
+
+# Zones read full habits/shop/skills views; records only store the overrides against the shared catalog.
+CATALOG_VIEWS = {"habits": "habit_overrides", "shop": "shop_overrides", "skills": "skill_overrides"}
+
+def with_views(username, record, guild=None):
+    # `guild` is passed by the scheduler thread, which has no session to look it up in.
+    guild = guild or get_guild()
+    data = {k: v for k, v in record.items() if k not in CATALOG_VIEWS}
+    for view, key in CATALOG_VIEWS.items():
+        # Records saved before the catalog carry a full copy of the template instead of overrides.
+        if key not in record and view in record: data[view] = record[view]
+        else: data[view] = guild.catalog().view(view, guild.template_for(username), record.get(key))
+    return data
+
+def to_record(username, data):
+    record = {k: v for k, v in data.items() if k not in CATALOG_VIEWS}
+    for view, key in CATALOG_VIEWS.items():
+        if view in data: record[key] = get_catalog().overlay(view, template_for(username), data[view])
+    return record
+
+def refresh_views(username):
+    for view, key in CATALOG_VIEWS.items():
+        st.session_state[view] = get_catalog().view(view, template_for(username), st.session_state.get(key))
+    st.session_state["_catalog_version"] = get_catalog().version
+
+# Heavy collections stay in the shared store cache and are copied into a session only when a zone touches them.
+LAZY_FIELDS = ("one_time_tasks", "workout_history", "weight_log")
 
 def init_user_data(username):
-    template = FAMILY_TEMPLATES.get(username, FAMILY_TEMPLATES["👨‍✈️ Dad (Monarch)"])
     return {
         "xp": {"Strength": 0, "Intellect": 0, "Vitality": 0, "Agility": 0, "Sense": 0, "Spirit": 0},
         "attributes": {"HP": 100, "Max_HP": 100, "Gold": 0},
-        "habits": template["habits"],
-        "shop": template["shop"],
+        "habit_overrides": {},
+        "shop_overrides": {},
         "one_time_tasks": [],
-        "completed_history": [],
-        "skills": DEFAULT_SKILLS, 
+        "skill_overrides": {},
         "workout_queue": {},
         "active_workout": None,
         "workout_history": [],
-        "inventory": [],
+        "exercise_index": {},
+        "plate_setup": copy.deepcopy(gym.DEFAULT_PLATE_SETUP),
+        "inventory": {},
+        "inventory_bought": {},
         "weight_log": {"dates": [], "weights": []},
-        "last_login": str(datetime.date.today())
+        "last_login": str(datetime.date.today()),
+        storage.VERSION_KEY: 0
     }
 
+def get_events():
+    return get_guild().events()
+
+def log_event(kind, source, xp=None, gold=0, note=""):
+    get_events().append(st.session_state.current_user, events.make_event(kind, source, xp, gold, note))
+
+def get_checkpoints():
+    return get_guild().checkpoints()
+
+def get_archive():
+    return get_guild().archive()
+
+def get_scheduler():
+    # Daily penalties and overdue tasks for the whole guild, off the render path.
+    guild = get_guild()
+    return guild.scheduler(STORAGE_BACKEND, lambda username, record: with_views(username, record, guild)["habits"], init_user_data)
+
+def sync_from_store(username):
+    # Background writers (the scheduler, other devices) may have moved this user on since the last run.
+    cached = get_store().load_all().get(username)
+    base = st.session_state["_base"]
+    if not cached or cached.get(storage.VERSION_KEY) == base.get(storage.VERSION_KEY):
+        return
+    old_hp = base["attributes"]["HP"]
+    changed = [k for k in base if k in cached and cached[k] != base[k]]
+    for k in changed:
+        st.session_state[k] = copy.deepcopy(cached[k])
+        base[k] = copy.deepcopy(cached[k])
+    if set(changed) & set(CATALOG_VIEWS.values()):
+        refresh_views(username)
+    if st.session_state.attributes["HP"] < old_hp:
+        st.toast(f"☠️ PENALTY: Missed Daily Quests! -{old_hp - st.session_state.attributes['HP']} HP", icon="🩸")
+        if st.session_state.attributes["HP"] <= 1:
+            st.error("⚠️ SYSTEM WARNING: CRITICAL STATE.")
+
+@metrics.timed("save")
 def save_current_user(username):
-    all_data = load_all_data()
     user_keys = init_user_data("temp").keys()
-    user_data = {k: v for k, v in st.session_state.items() if k in user_keys}
-    all_data[username] = user_data
-    with open(SAVE_FILE, "w") as f:
-        json.dump(all_data, f)
+    user_data = to_record(username, {k: v for k, v in st.session_state.items() if k in user_keys or k in CATALOG_VIEWS})
+    base = st.session_state.get("_base", {})
+    lazy = {k: v for k, v in user_data.items() if isinstance(v, storage.LazyField)}
+    eager = {k: v for k, v in user_data.items() if k not in lazy}
+    # Only fields that differ from the last saved state are dirty; a no-op click writes nothing.
+    dirty = storage.dirty_fields(base, eager)
+    if not dirty and not any(field.dirty for field in lazy.values()):
+        return
+    # Another device may have saved this user since we loaded; the store merges and hands back the result.
+    saved = get_store().save_user(username, user_data, base=base)
+    for field in lazy.values():
+        field.reset()
+    if "active_workout" in dirty:
+        get_checkpoints().clear(username)
+    changed = storage.dirty_fields(base, {k: saved[k] for k in eager})
+    for k in changed:
+        st.session_state[k] = saved[k]
+        base[k] = copy.deepcopy(saved[k])
+    st.session_state["_base"] = base
+    if set(changed) & set(CATALOG_VIEWS.values()):
+        refresh_views(username)
 
-def admin_save_target_user(target_username, target_data):
-    all_data = load_all_data()
-    all_data[target_username] = target_data
-    with open(SAVE_FILE, "w") as f:
-        json.dump(all_data, f)
+@metrics.timed("admin_save")
+def admin_save_target_user(target_username, target_data, target_base=None):
+    # The Admin Panel never loads the heavy fields; untouched LazyFields resolve to the committed values.
+    defaults = init_user_data(target_username)
+    record = to_record(target_username, target_data)
+    record.update({k: storage.LazyField(get_store(), target_username, k, defaults[k]) for k in LAZY_FIELDS})
+    get_store().save_user(target_username, record, base=target_base)
 
 # --- VISUALS ---
 local_css()
 
 # --- LOGIN SCREEN ---
 st.sidebar.title("🏰 The Guild Hall")
-all_data = load_all_data()
-user_list = list(FAMILY_TEMPLATES.keys())
+guild_list = get_guilds().list()
+selected_guild = guild_list[0][0]
+if len(guild_list) > 1:
+    selected_guild = st.sidebar.selectbox("Select Guild:", [slug for slug, _ in guild_list], format_func=dict(guild_list).get)
+if st.session_state.get("guild") != selected_guild:
+    # Each guild has its own shard; a member of the old one is logged out.
+    st.session_state.guild = selected_guild
+    st.session_state.pop("current_user", None)
+with metrics.timer("load"):
+    all_data = load_all_data()
+# The one guild.json revalidation per rerun; get_guild() below is a plain lookup.
+user_list = list(get_guilds().open(selected_guild, revalidate=True).members)
 selected_user = st.sidebar.selectbox("Select Character:", user_list)
 
 if 'current_user' not in st.session_state or st.session_state.current_user != selected_user:
     st.session_state.current_user = selected_user
-    user_data = all_data.get(selected_user, init_user_data(selected_user))
+    store = get_store()
+    defaults = init_user_data(selected_user)
+    cached = store.load_all().get(selected_user) or {}
+    # SQLite always hands back an (empty) completed_history, so only a non-empty one needs importing.
+    legacy_tasks = any("id" not in t or t.get("done") for t in cached.get("one_time_tasks", []))
+    legacy_inventory = isinstance(cached.get("inventory"), list)
+    if cached.get("completed_history") or legacy_tasks or legacy_inventory or any(view in cached for view in CATALOG_VIEWS):
+        user_data = store.load_user(selected_user)
+        if legacy_inventory:
+            user_data["inventory"], user_data["inventory_bought"] = inventory.from_legacy(user_data["inventory"])
+        get_events().import_legacy(selected_user, user_data.pop("completed_history", []))
+        user_data["one_time_tasks"], archived = tasks.split_legacy(user_data.get("one_time_tasks", []))
+        get_archive().extend_once(selected_user, archived)
+        store.save_user(selected_user, to_record(selected_user, with_views(selected_user, user_data)), base=store.load_user(selected_user))
+    cached = store.load_all().get(selected_user) or {}
+    user_data = store.load_user(selected_user, skip=LAZY_FIELDS + ("completed_history",)) or {k: v for k, v in defaults.items() if k not in LAZY_FIELDS}
     # Migration checks
-    if "shop" not in user_data: user_data["shop"] = FAMILY_TEMPLATES[selected_user]["shop"]
     if "attributes" in user_data and "Gold" not in user_data["attributes"]: user_data["attributes"]["Gold"] = 0
-    
+    rebuilt_index = "exercise_index" not in user_data
+    if rebuilt_index:
+        user_data["exercise_index"] = gym.build_exercise_index(cached.get("workout_history", []))
+
     for k, v in user_data.items():
         st.session_state[k] = v
-    st.rerun()
+    for k in LAZY_FIELDS:
+        st.session_state[k] = storage.LazyField(store, selected_user, k, defaults[k])
+    # A rebuilt index is left out of the base so the save below sees it as dirty and persists it.
+    st.session_state["_base"] = copy.deepcopy({k: v for k, v in user_data.items() if not (rebuilt_index and k == "exercise_index")})
+    # Set taps since the last exercise boundary; they stay dirty until the next commit.
+    resumed = get_checkpoints().load(selected_user, user_data.get("active_workout"))
+    if resumed: st.session_state.active_workout = resumed
+    refresh_views(selected_user)
+    if rebuilt_index: save_current_user(selected_user)
+else:
+    sync_from_store(selected_user)
+get_scheduler().start()
+
+# Copies a zone paged in on the last run are handed back unless they still hold unsaved edits.
+for k in LAZY_FIELDS:
+    st.session_state[k].release()
+# An admin added to the shared catalog since this session built its views.
+if st.session_state.get("_catalog_version") != get_catalog().version:
+    refresh_views(st.session_state.current_user)
 
 # --- HELPER FUNCTIONS ---
 def get_rank(total_xp):
@@ -217,180 +393,163 @@ def check_level_up(category, old_xp, new_xp):
         st.toast(f"💰 BONUS: +100 Gold", icon="🪙")
         st.toast("❤️ HP Restored!", icon="✨")
 
-def apply_daily_penalty():
-    today = str(datetime.date.today())
-    last = st.session_state.last_login
-    if today != last:
-        yesterday_obj = datetime.date.today() - datetime.timedelta(days=1)
-        yesterday_str = yesterday_obj.isoformat()
-        missed_count = 0
-        for habit, data in st.session_state.habits.items():
-            last_done = data[1]
-            if last_done != yesterday_str and last_done != today:
-                missed_count += 1
-        if missed_count > 0:
-            damage = missed_count * 10
-            st.session_state.attributes["HP"] -= damage
-            st.toast(f"☠️ PENALTY: You missed {missed_count} Daily Quests! -{damage} HP", icon="🩸")
-            if st.session_state.attributes["HP"] <= 0:
-                st.session_state.attributes["HP"] = 1 
-                st.error("⚠️ SYSTEM WARNING: CRITICAL STATE.")
-        st.session_state.last_login = today
-        save_current_user(st.session_state.current_user)
-
-apply_daily_penalty()
-
 # --- GYM HELPERS ---
 def calculate_plates(target_weight):
     try: target = float(target_weight)
     except: return "Enter a valid number"
-    if target < 45: return "Weight must be >= 45 (Bar)"
-    weight_per_side = (target - 45) / 2
-    inventory = {45: 2, 35: 2, 25: 2, 15: 2, 10: 4, 5: 2, 2.5: 2}
-    plates_needed = []
-    for plate in sorted(inventory.keys(), reverse=True):
-        while weight_per_side >= plate and inventory[plate] >= 2:
-            plates_needed.append(str(plate))
-            weight_per_side -= plate
-            inventory[plate] -= 2
-    if weight_per_side > 0: return f"Load: {', '.join(plates_needed)} + {weight_per_side} lbs remainder"
-    if not plates_needed: return "Bar Only"
-    return f"Per Side: [{' | '.join(plates_needed)}]"
-
-def parse_csv_workout(csv_text):
-    try:
-        df = pd.read_csv(StringIO(csv_text))
-        df.columns = [c.strip().lower() for c in df.columns]
-        required = ['day', 'exercise', 'sets', 'reps']
-        if not all(col in df.columns for col in required): return None, "Error: CSV must have columns: Day, Exercise, Sets, Reps"
-        weekly_plan = {}
-        for day_name, group in df.groupby('day'):
-            exercises = []
-            for _, row in group.iterrows():
-                exercises.append({
-                    "name": row['exercise'], "sets": str(row['sets']), "reps": str(row['reps']),
-                    "trainer_note": row.get('notes', ''), "my_weight": "", "my_notes": "", "sets_completed": 0
-                })
-            weekly_plan[day_name] = exercises
-        return weekly_plan, f"Loaded {len(weekly_plan)} days of missions!"
-    except Exception as e: return None, f"CSV Error: {e}"
+    solver = gym.plate_solver(st.session_state.get("plate_setup"))
+    if target < solver.bar: return f"Weight must be >= {solver.bar:g} (Bar)"
+    plates, below, above = solver.solve(target)
+    if plates is None:
+        nearest = " or ".join(f"{w:g}" for w in (below, above) if w is not None)
+        return f"Can't load {target:g} exactly. Nearest: {nearest}"
+    if not plates: return "Bar Only"
+    return f"Per Side: [{gym.format_plates(plates)}]"
 
 def extract_time(reps_str):
-    reps_str = reps_str.lower()
-    if 's' in reps_str or 'sec' in reps_str:
-        import re
-        num = re.findall(r'\d+', reps_str)
-        return int(num[0]) if num else 0
-    elif 'min' in reps_str:
-        import re
-        num = re.findall(r'\d+', reps_str)
-        return int(num[0]) * 60 if num else 0
-    return 0
+    import re
+    # Only an explicit unit makes a set timed: "10 reps" and "10 each side" are not.
+    minutes = re.search(r"(\d+)\s*(?:min|mins|minutes?)\b", reps_str, re.I)
+    if minutes:
+        return int(minutes.group(1)) * 60
+    seconds = re.search(r"(\d+)\s*(?:s|sec|secs|seconds?)\b", reps_str, re.I)
+    return int(seconds.group(1)) if seconds else 0
+
+DEFAULT_REST_SECONDS = 90
+_countdown = components.declare_component(
+    "countdown", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "countdown"))
+
+def countdown(label, seconds, kind, key, autostart=False):
+    # Ticks in the browser; the server hears back once, when it reaches zero. The component keeps
+    # returning that value on later reruns, so each finish is handed out only the first time.
+    value = _countdown(label=label, seconds=seconds, kind=kind, autostart=autostart, key=key, default=None)
+    seen = st.session_state.setdefault("_countdowns_finished", {})
+    if not value or seen.get(key) == value["finished_at"]:
+        return None
+    seen[key] = value["finished_at"]
+    return value
 
 def get_previous_log(exercise_name):
-    if st.session_state.workout_history:
-        for session in reversed(st.session_state.workout_history):
-            if "exercises" in session:
-                for ex in session["exercises"]:
-                    if exercise_name.lower().strip() == ex["name"].lower().strip():
-                        if ex.get("my_weight") or ex.get("my_notes"):
-                            return ex.get("my_weight", "N/A"), ex.get("my_notes", "No notes")
+    logs = gym.recent_logs(st.session_state.exercise_index, exercise_name)
+    if logs:
+        return logs[0]["weight"], logs[0]["notes"]
     return None, None
 
 # --- NAVIGATION ---
-menu_options = ["🏠 Dashboard", "🔥 Quest Board", "💰 Market", "🎒 Inventory", "🌳 Legacy Skills", "🏋️ Gym", "📜 History"]
-is_admin = "Dad" in st.session_state.current_user or "Mom" in st.session_state.current_user
+menu_options = ["🏠 Dashboard", "🔥 Quest Board", "💰 Market", "🎒 Inventory", "🌳 Legacy Skills", "🏋️ Gym", "📜 History", "📈 Analytics"]
+is_admin = any(role in template_for(st.session_state.current_user) for role in ("Dad", "Mom"))
 if is_admin:
     menu_options.append("👑 Admin Panel")
 
 menu = st.sidebar.radio("MENU", menu_options)
 
 # --- SIDEBAR DISPLAY ---
-st.sidebar.divider()
-total_xp = sum(st.session_state.xp.values())
-player_level = total_xp // 100 + 1
-rank_title = get_rank(total_xp)
-
-prefix = ROLE_PREFIXES.get(st.session_state.current_user, "dad")
-suffix = RANK_SUFFIXES.get(rank_title, "rank_e")
-image_file = f"{prefix}_{suffix}.png"
-image_path = os.path.join("assets", image_file)
-
-if os.path.exists(image_path):
-    st.sidebar.image(image_path, caption=f"{st.session_state.current_user}")
-else:
-    fallback = os.path.join("assets", f"{prefix}_rank_e.png")
-    if os.path.exists(fallback):
-        st.sidebar.image(fallback, caption=f"{st.session_state.current_user}")
-    else:
-        st.sidebar.warning(f"⚠️ Missing: {image_file}")
-
-hp = st.session_state.attributes["HP"]
-max_hp = st.session_state.attributes["Max_HP"]
-gold = st.session_state.attributes.get("Gold", 0)
-
-st.sidebar.write(f"❤️ **HP: {hp}/{max_hp}**")
-st.sidebar.progress(hp / max_hp)
-st.sidebar.write(f"🪙 **Gold: {gold} GP**")
-
-st.sidebar.markdown(f"<small>⚡ <b>XP to Next Level</b></small>", unsafe_allow_html=True)
-st.sidebar.markdown('<div class="xp-bar">', unsafe_allow_html=True)
-st.sidebar.progress((total_xp % 100) / 100)
-st.sidebar.markdown('</div>', unsafe_allow_html=True)
-
-st.sidebar.divider()
-cols = st.sidebar.columns(2)
-for i, (stat, val) in enumerate(st.session_state.xp.items()):
-    stat_lvl = val // 100 + 1
-    stat_prog = (val % 100) / 100
-    with cols[i % 2]:
-        st.markdown(f"<div style='font-size: 0.8rem;'><b>{stat}</b> Lv.{stat_lvl}</div>", unsafe_allow_html=True)
-        st.progress(stat_prog)
+# Avatar, HP, Gold and XP bars live in one container that each zone redraws, so a
+# fragment rerun (Quest Board, Market, Inventory, Gym) refreshes them in place.
+sidebar_stats = st.sidebar.container()
+sidebar_stats.divider()
+
+@metrics.timed("sidebar")
+def draw_sidebar_stats():
+    with sidebar_stats:
+        total_xp = sum(st.session_state.xp.values())
+        rank_title = get_rank(total_xp)
+
+        prefix = ROLE_PREFIXES.get(template_for(st.session_state.current_user), "dad")
+        suffix = RANK_SUFFIXES.get(rank_title, "rank_e")
+        thumb = get_avatars().thumb(prefix, suffix)
+
+        if thumb is None:
+            st.warning(f"⚠️ Missing: {prefix}_{suffix}.png")
+        elif st.get_option("server.enableStaticServing"):
+            # The browser fetches the hashed thumbnail itself; nothing is read or sent from here.
+            st.markdown(f'<figure style="margin:0"><img src="{AVATAR_URL}/{thumb}" style="width:100%">'
+                        f'<figcaption style="text-align:center;font-size:0.85rem;opacity:0.6">{html.escape(st.session_state.current_user)}</figcaption></figure>',
+                        unsafe_allow_html=True)
+        else:
+            st.image(get_avatars().path(thumb), caption=f"{st.session_state.current_user}")
+
+        hp = st.session_state.attributes["HP"]
+        max_hp = st.session_state.attributes["Max_HP"]
+        gold = st.session_state.attributes.get("Gold", 0)
+
+        st.write(f"❤️ **HP: {hp}/{max_hp}**")
+        st.progress(hp / max_hp)
+        st.write(f"🪙 **Gold: {gold} GP**")
+
+        st.markdown(f"<small>⚡ <b>XP to Next Level</b></small>", unsafe_allow_html=True)
+        st.markdown('<div class="xp-bar">', unsafe_allow_html=True)
+        st.progress((total_xp % 100) / 100)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+        st.divider()
+        cols = st.columns(2)
+        for i, (stat, val) in enumerate(st.session_state.xp.items()):
+            stat_lvl = val // 100 + 1
+            stat_prog = (val % 100) / 100
+            with cols[i % 2]:
+                st.markdown(f"<div style='font-size: 0.8rem;'><b>{stat}</b> Lv.{stat_lvl}</div>", unsafe_allow_html=True)
+                st.progress(stat_prog)
+
+def rerun_zone():
+    # Inside a fragment only that zone (and the sidebar stats) is redrawn. Full
+    # reruns, e.g. under AppTest, can't scope to a fragment and fall back to st.rerun().
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
 # =========================================================
 #  ZONE 1: DASHBOARD
 # =========================================================
-if menu == "🏠 Dashboard":
-    st.title(f"Hello, {st.session_state.current_user.split()[1]}!")
+@metrics.timed("zone:dashboard")
+def dashboard_zone():
+    total_xp = sum(st.session_state.xp.values())
+    gold = st.session_state.attributes.get("Gold", 0)
+    # First word that isn't the role emoji: "👨‍✈️ Dad (Monarch)" -> Dad, "Alice" -> Alice.
+    first_name = next((w for w in st.session_state.current_user.split() if any(c.isalpha() for c in w)), st.session_state.current_user)
+    st.title(f"Hello, {first_name}!")
     c1, c2, c3 = st.columns(3)
     c1.metric("Gold Coins", f"{gold} GP")
-    c2.metric("Loot Bags", len(st.session_state.inventory))
+    c2.metric("Loot Bags", inventory.total(st.session_state.inventory))
     c3.metric("Total XP", total_xp)
     st.divider()
     
     st.subheader("🏆 Guild Leaderboard")
-    leaderboard = []
-    for user, data in all_data.items():
-        xp = sum(data["xp"].values())
-        u_gold = data["attributes"].get("Gold", 0)
-        rank = get_rank(xp)
-        leaderboard.append({"User": user, "Rank": rank, "Gold": u_gold, "Total XP": xp})
+    # Precomputed by the store on every save; already sorted by total XP.
+    leaderboard = [{"User": e["user"], "Rank": get_rank(e["total_xp"]), "Gold": e["gold"], "Total XP": e["total_xp"]}
+                   for e in get_store().top()]
     if leaderboard:
-        st.dataframe(pd.DataFrame(leaderboard).sort_values("Total XP", ascending=False), use_container_width=True)
+        st.dataframe(pd.DataFrame(leaderboard), use_container_width=True)
         
     st.divider()
-    if "Dad" in st.session_state.current_user or "Son" in st.session_state.current_user:
+    if any(role in template_for(st.session_state.current_user) for role in ("Dad", "Son")):
         st.subheader("⚖️ Body Mass Tracker")
         c_chart, c_input = st.columns([3, 1])
         with c_input:
             with st.form("weight_in"):
                 w_in = st.number_input("Current Weight (lbs)", min_value=0.0, step=0.1)
                 if st.form_submit_button("Log Weigh-In"):
-                    st.session_state.weight_log["dates"].append(str(datetime.date.today()))
-                    st.session_state.weight_log["weights"].append(w_in)
+                    bodyweight.upsert(st.session_state.weight_log, datetime.date.today(), w_in)
                     save_current_user(st.session_state.current_user)
                     st.toast("Weight Logged!", icon="⚖️")
                     st.rerun()
         with c_chart:
-            if st.session_state.weight_log["weights"]:
-                df_weight = pd.DataFrame({"Date": st.session_state.weight_log["dates"], "Weight": st.session_state.weight_log["weights"]})
-                st.line_chart(df_weight.set_index("Date"))
+            user = st.session_state.current_user
+            weights = bodyweight.load_series(get_store(), user, record_version(user))
+            if len(weights):
+                frame, resolution = weights.chart()
+                st.caption(f"{resolution} · latest {weights.values[-1]:.1f} lbs")
+                st.line_chart(frame)
             else: st.info("Log your weight to see the chart.")
 
 # =========================================================
 #  ZONE 2: QUEST BOARD (UPDATED WITH DUE DATES)
 # =========================================================
-elif menu == "🔥 Quest Board":
+@st.fragment
+@metrics.timed("zone:quest_board")
+def quest_board_zone():
+    draw_sidebar_stats()
     st.title("⚡ Daily Quests")
     
     st.subheader("🔁 Habits (+5 Gold)")
@@ -409,57 +568,45 @@ elif menu == "🔥 Quest Board":
                             old_xp = st.session_state.xp[stat]
                             st.session_state.xp[stat] += 15
                             st.session_state.attributes["Gold"] += 5
-                            st.session_state.completed_history.append(f"{datetime.date.today()} - {habit} (+5 GP)")
+                            log_event("habit", habit, xp={stat: 15}, gold=5)
                             check_level_up(stat, old_xp, st.session_state.xp[stat])
                             save_current_user(st.session_state.current_user)
-                            st.rerun()
+                            rerun_zone()
 
     st.subheader("📜 Assigned Tasks (Check Due Dates)")
-    if not st.session_state.one_time_tasks:
+    today = datetime.date.today().isoformat()
+    overdue, due_today, upcoming = tasks.due_groups(st.session_state.one_time_tasks, today)
+    if not (overdue or due_today or upcoming):
         st.info("No active tasks.")
-    
-    for i, task in enumerate(st.session_state.one_time_tasks):
-        if not task["done"]:
-            # Due Date Logic
-            due_str = task.get("due_date", str(datetime.date.today()))
-            due_date = datetime.datetime.strptime(due_str, "%Y-%m-%d").date()
-            today = datetime.date.today()
-            
-            # Label
-            label = f"⬜ {task['name']}"
-            note = f"+40 {task['stat']}"
-            gold_reward = 25
-            
-            if due_date < today:
-                label += " (LATE)"
-                note += " | 🚨 OVERDUE (-15 GP Penalty)"
-                gold_reward = 10 # Late penalty
-                color_class = "late-task"
-            elif due_date == today:
-                label += " (DUE TODAY)"
-                note += " | ⚠️ Due Today!"
-                color_class = "due-today"
-            else:
-                note += f" | 📅 Due: {due_str}"
-                color_class = "normal"
-
-            if st.button(f"{label} \n {note}", key=f"ot_{i}", use_container_width=True):
-                st.session_state.one_time_tasks[i]["done"] = True
-                old_xp = st.session_state.xp[task['stat']]
-                st.session_state.xp[task['stat']] += 40
-                st.session_state.attributes["Gold"] += gold_reward
-                
-                status_msg = "LATE" if gold_reward == 10 else "ON TIME"
-                st.session_state.completed_history.append(f"{datetime.date.today()} - Task: {task['name']} ({status_msg}) (+{gold_reward} GP)")
-                
-                check_level_up(task['stat'], old_xp, st.session_state.xp[task['stat']])
-                save_current_user(st.session_state.current_user)
-                st.rerun()
+
+    board = [(task, " (LATE)", " | 🚨 OVERDUE (-15 GP Penalty)", 10) for task in overdue]  # Late penalty
+    board += [(task, " (DUE TODAY)", " | ⚠️ Due Today!", 25) for task in due_today]
+    board += [(task, "", f" | 📅 Due: {task['due_date']}", 25) for task in upcoming]
+    for task, label_suffix, due_note, gold_reward in board:
+        label = f"{'🔁' if task.get('rule') else '⬜'} {task['name']}{label_suffix}"
+        note = f"+40 {task['stat']}{due_note}"
+        if st.button(f"{label} \n {note}", key=f"ot_{task['id']}", use_container_width=True):
+            tasks.complete(st.session_state.one_time_tasks, task["id"])
+            old_xp = st.session_state.xp[task['stat']]
+            st.session_state.xp[task['stat']] += 40
+            st.session_state.attributes["Gold"] += gold_reward
+
+            status_msg = "LATE" if gold_reward == 10 else "ON TIME"
+            get_archive().append(st.session_state.current_user, tasks.archive_entry(task, gold_reward, status_msg))
+            log_event("task", task['name'], xp={task['stat']: 40}, gold=gold_reward, note=status_msg)
+
+            check_level_up(task['stat'], old_xp, st.session_state.xp[task['stat']])
+            save_current_user(st.session_state.current_user)
+            rerun_zone()
 
 # =========================================================
 #  ZONE 3: MARKET
 # =========================================================
-elif menu == "💰 Market":
+@st.fragment
+@metrics.timed("zone:market")
+def market_zone():
+    draw_sidebar_stats()
+    gold = st.session_state.attributes.get("Gold", 0)
     st.title("💰 The Goblin Market")
     st.caption(f"Current Balance: {gold} GP")
     
@@ -467,43 +614,55 @@ elif menu == "💰 Market":
         cols = st.columns(3)
         for i, (item, price) in enumerate(st.session_state.shop.items()):
             with cols[i % 3]:
+                iid = inventory.item_id(item)
                 with st.container(border=True):
                     st.markdown(f"**{item}**")
-                    st.markdown(f"🪙 **{price} GP**")
+                    owned = st.session_state.inventory.get(iid, {}).get("count", 0)
+                    st.markdown(f"🪙 **{price} GP**" + (f" · 🎒 {owned} owned" if owned else ""))
                     if gold >= price:
-                        if st.button(f"Buy", key=f"buy_{i}"):
+                        if st.button(f"Buy", key=f"buy_{iid}"):
                             st.session_state.attributes["Gold"] -= price
-                            st.session_state.inventory.append(item)
+                            inventory.add(st.session_state.inventory, st.session_state.inventory_bought, item)
                             st.toast(f"Purchased {item}!", icon="🛍️")
-                            st.session_state.completed_history.append(f"{datetime.date.today()} - Bought {item} (-{price} GP)")
+                            log_event("purchase", item, gold=-price)
                             save_current_user(st.session_state.current_user)
-                            st.rerun()
+                            rerun_zone()
                     else:
-                        st.button(f"Need {price-gold} more", key=f"no_{i}", disabled=True)
+                        st.button(f"Need {price-gold} more", key=f"no_{iid}", disabled=True)
     else:
         st.info("Market is closed.")
 
 # =========================================================
 #  ZONE 4: INVENTORY
 # =========================================================
-elif menu == "🎒 Inventory":
+@st.fragment
+@metrics.timed("zone:inventory")
+def inventory_zone():
+    draw_sidebar_stats()
     st.title("🎒 My Loot")
-    if not st.session_state.inventory:
+    stacks = inventory.held(st.session_state.inventory)
+    if not stacks:
         st.info("No items purchased.")
     else:
-        for i, item in enumerate(st.session_state.inventory):
-            c1, c2 = st.columns([3, 1])
-            c1.success(f"📦 {item}")
-            if c2.button("Redeem / Use", key=f"use_{i}"):
-                st.session_state.inventory.pop(i)
-                st.toast(f"Redeemed: {item}!", icon="✅")
+        # One row per distinct item; widget keys follow the item id, not its position.
+        for iid, stack in stacks.items():
+            c1, c2, c3 = st.columns([3, 1, 1])
+            since = inventory.oldest(st.session_state.inventory_bought, iid)
+            c1.success(f"📦 {stack['name']} ×{stack['count']}" + (f" · since {datetime.date.fromtimestamp(since)}" if since else ""))
+            n = c2.number_input("How many", min_value=1, max_value=stack["count"], value=1, key=f"use_n_{iid}",
+                                label_visibility="collapsed", disabled=stack["count"] == 1)
+            if c3.button("Redeem / Use", key=f"use_{iid}"):
+                name, n = inventory.redeem(st.session_state.inventory, st.session_state.inventory_bought, iid, n)
+                st.toast(f"Redeemed: {name}" + (f" ×{n}" if n > 1 else "") + "!", icon="✅")
+                log_event("redeem", name, note=f"x{n}" if n > 1 else "")
                 save_current_user(st.session_state.current_user)
-                st.rerun()
+                rerun_zone()
 
 # =========================================================
 #  ZONE 5: LEGACY SKILLS
 # =========================================================
-elif menu == "🌳 Legacy Skills":
+@metrics.timed("zone:skills")
+def skills_zone():
     st.title("🌳 Skill Tree")
     
     # Only Admin adds skills
@@ -517,8 +676,8 @@ elif menu == "🌳 Legacy Skills":
             new_xp = c4.number_input("XP Amount", value=50, step=10)
             if st.button("Create Skill"):
                 if new_name:
-                    st.session_state.skills[new_cat][new_name] = {"status": "In Progress", "attr": new_attr, "xp": new_xp}
-                    save_current_user(st.session_state.current_user)
+                    # Added to the shared catalog, so every member's tree gets it.
+                    get_catalog().set_entry("skills", None, [new_cat, new_name], {"status": "In Progress", "attr": new_attr, "xp": new_xp})
                     st.success(f"Added {new_name}!")
                     st.rerun()
         st.divider()
@@ -546,7 +705,7 @@ elif menu == "🌳 Legacy Skills":
                         
                         old_val = st.session_state.xp[attr]
                         st.session_state.xp[attr] += xp_val
-                        st.session_state.completed_history.append(f"{datetime.date.today()} - Mastered: {skill_name}")
+                        log_event("skill", skill_name, xp={attr: xp_val})
                         check_level_up(attr, old_val, st.session_state.xp[attr])
                         save_current_user(st.session_state.current_user)
                         st.balloons()
@@ -555,17 +714,41 @@ elif menu == "🌳 Legacy Skills":
 # =========================================================
 #  ZONE 6: GYM
 # =========================================================
-elif menu == "🏋️ Gym":
+@st.fragment
+@metrics.timed("zone:gym")
+def gym_zone():
+    draw_sidebar_stats()
     st.title("⛓️ The Dungeon")
     if not st.session_state.active_workout:
         with st.expander("Import CSV Workout"):
+             st.caption("Columns: Day, Exercise, Sets, Reps (+ optional Week, Order, Load%, Notes, Rest)")
+             csv_file = st.file_uploader("Program File", type=["csv"])
              csv_input = st.text_area("CSV Data")
              if st.button("Load"):
-                 plan, msg = parse_csv_workout(csv_input)
+                 plan, errors, msg = gym.import_program(csv_file if csv_file is not None else StringIO(csv_input), get_guild().path(guilds.PROGRAMS_DIR))
+                 if errors:
+                     st.warning(f"Skipped {len(errors)} bad rows:")
+                     st.dataframe(pd.DataFrame(errors[:200]), hide_index=True)
                  if plan:
+                     old_queue = st.session_state.workout_queue
                      st.session_state.workout_queue = plan
                      save_current_user(st.session_state.current_user)
-                     st.rerun()
+                     gym.release_programs(old_queue, st.session_state.workout_queue)
+                     if not errors: rerun_zone()
+                     st.success(msg)
+                 else: st.error(msg)
+        with st.expander("⚙️ Gym Setup (Bar & Plates)"):
+            setup = st.session_state.get("plate_setup") or gym.DEFAULT_PLATE_SETUP
+            bar_in = st.number_input("Bar Weight (lbs)", value=float(setup["bar"]), step=5.0)
+            plates_df = st.data_editor(
+                pd.DataFrame({"Plate": [float(p) for p in setup["plates"]], "Count": list(setup["plates"].values())}),
+                num_rows="dynamic", hide_index=True, key="plate_editor")
+            if st.button("Save Plates"):
+                rows = plates_df.dropna()
+                st.session_state.plate_setup = {"bar": bar_in, "plates": {f"{p:g}": int(n) for p, n in zip(rows["Plate"], rows["Count"]) if n > 0}}
+                save_current_user(st.session_state.current_user)
+                st.toast("Plate inventory saved!", icon="🏋️")
+                rerun_zone()
         if st.session_state.workout_queue:
             day_opt = list(st.session_state.workout_queue.keys())
             sel_day = st.selectbox("Select Workout", day_opt)
@@ -573,11 +756,11 @@ elif menu == "🏋️ Gym":
                 st.session_state.active_workout = {
                     "date": datetime.date.today().isoformat(),
                     "day_name": sel_day,
-                    "exercises": st.session_state.workout_queue[sel_day],
+                    "exercises": gym.load_program_day(st.session_state.workout_queue[sel_day]),
                     "current_step": 0
                 }
                 save_current_user(st.session_state.current_user)
-                st.rerun()
+                rerun_zone()
     else:
         workout = st.session_state.active_workout
         step = workout["current_step"]
@@ -590,34 +773,64 @@ elif menu == "🏋️ Gym":
                 st.session_state.xp["Strength"] += 150
                 st.session_state.xp["Agility"] += 50
                 st.session_state.attributes["Gold"] += 50
-                st.session_state.completed_history.append(f"{datetime.date.today()} - Cleared Dungeon (+200 XP | +50 GP)")
+                log_event("dungeon", workout["day_name"], xp={"Strength": 150, "Agility": 50}, gold=50)
                 st.session_state.workout_history.append(workout)
+                gym.index_session(st.session_state.exercise_index, workout)
+                old_queue = dict(st.session_state.workout_queue)
                 del st.session_state.workout_queue[workout["day_name"]]
                 st.session_state.active_workout = None
                 check_level_up("Strength", old_xp, st.session_state.xp["Strength"])
                 save_current_user(st.session_state.current_user)
-                st.rerun()
+                gym.release_programs(old_queue, st.session_state.workout_queue)
+                rerun_zone()
         else:
             ex = workout["exercises"][step]
             st.markdown(f"## ⚔️ {ex['name']}")
             prev_w, prev_n = get_previous_log(ex['name'])
             if prev_w: st.info(f"Last: {prev_w} | {prev_n}")
+            recent = gym.recent_logs(st.session_state.exercise_index, ex['name'])
+            if len(recent) > 1:
+                st.caption("Last sessions: " + " · ".join(f"{r['date'][5:]} {r['weight'] or '—'}" for r in recent))
             with st.expander("🧮 Plate Calc"):
                 target = st.number_input("Target", value=135, step=5)
                 st.code(calculate_plates(target))
+                # Whole-day loading sheet from today's entries or the last logged weights.
+                targets = {}
+                for e in workout["exercises"]:
+                    recent = gym.recent_logs(st.session_state.exercise_index, e["name"])
+                    try: targets[e["name"]] = float(e["my_weight"] or (recent[0]["weight"] if recent else ""))
+                    except ValueError: pass
+                if targets:
+                    sheet = [{"Exercise": name, "Weight": w, "Plates": calculate_plates(w)} for name, w in targets.items()]
+                    st.dataframe(pd.DataFrame(sheet), hide_index=True, use_container_width=True)
             c1, c2 = st.columns(2)
             c1.metric("Sets", ex['sets'])
             c2.metric("Reps", ex['reps'])
+            if ex.get('load_pct'): st.caption(f"🎯 Load: {ex['load_pct']:g}% of max")
+            if isinstance(ex.get('trainer_note'), str) and ex['trainer_note']: st.caption(f"📝 {ex['trainer_note']}")
             try: num_sets = int(str(ex['sets']).split('-')[0])
             except: num_sets = 3
             cols = st.columns(num_sets)
+            set_done = False
             for i in range(num_sets):
                 if i < ex['sets_completed']: cols[i].button(f"✅ {i+1}", key=f"d_{i}", disabled=True)
                 elif i == ex['sets_completed']: 
-                    if cols[i].button(f"Go {i+1}", key=f"g_{i}"):
-                        st.session_state.active_workout["exercises"][step]["sets_completed"] += 1
-                        save_current_user(st.session_state.current_user)
-                        st.rerun()
+                    set_done = cols[i].button(f"Go {i+1}", key=f"g_{i}")
+            # Timed sets ("30s", "2 min") and rest periods count down client-side; keys change per set.
+            done_sets = ex['sets_completed']
+            hold = extract_time(str(ex['reps']))
+            if hold and done_sets < num_sets:
+                if countdown(f"Set {done_sets + 1}: hold {ex['reps']}", hold, "set", key=f"hold_{step}_{done_sets}"):
+                    set_done = True
+            if 0 < done_sets < num_sets:
+                rest = extract_time(str(ex.get('rest') or "")) or DEFAULT_REST_SECONDS
+                if countdown(f"Rest before set {done_sets + 1}", rest, "rest", key=f"rest_{step}_{done_sets}", autostart=True):
+                    st.toast(f"⏱️ Rest over. Go {done_sets + 1}!", icon="🔔")
+            if set_done:
+                st.session_state.active_workout["exercises"][step]["sets_completed"] += 1
+                # Committed to the store with Next; until then only the checkpoint is rewritten.
+                get_checkpoints().save(st.session_state.current_user, st.session_state.active_workout)
+                rerun_zone()
             with st.form(f"f_{step}"):
                 w = st.text_input("Weight", value=ex['my_weight'])
                 n = st.text_input("Notes", value=ex['my_notes'])
@@ -626,45 +839,105 @@ elif menu == "🏋️ Gym":
                     st.session_state.active_workout["exercises"][step]["my_notes"] = n
                     st.session_state.active_workout["current_step"] += 1
                     save_current_user(st.session_state.current_user)
-                    st.rerun()
+                    rerun_zone()
             if st.button("Abort"):
                 st.session_state.active_workout = None
                 save_current_user(st.session_state.current_user)
-                st.rerun()
+                rerun_zone()
 
 # =========================================================
 #  ZONE 7: HISTORY
 # =========================================================
-elif menu == "📜 History":
+@metrics.timed("zone:history")
+def history_zone():
     st.title("📜 Chronicle")
-    for entry in reversed(st.session_state.completed_history):
-        st.text(entry)
+    f1, f2, f3 = st.columns([2, 2, 1])
+    kinds = f1.multiselect("Kind", events.EVENT_KINDS, format_func=str.title)
+    dates = f2.date_input("Date Range", value=())
+    page_size = f3.selectbox("Per Page", [25, 50, 100])
+    start = dates[0] if len(dates) > 0 else None
+    end = dates[1] if len(dates) > 1 else start
+
+    # Cursor stack: the last entry is where the current page starts; filters reset it.
+    filters = (st.session_state.current_user, tuple(kinds), tuple(dates), page_size)
+    if st.session_state.get("chronicle_filters") != filters:
+        st.session_state.chronicle_filters = filters
+        st.session_state.chronicle_cursors = [None]
+    cursors = st.session_state.chronicle_cursors
+    page, next_cursor = get_events().page(st.session_state.current_user, limit=page_size, cursor=cursors[-1],
+                                          kinds=kinds or None, start=start, end=end)
+    if page:
+        st.dataframe(pd.DataFrame([events.describe(e) for e in page]), hide_index=True, use_container_width=True)
+    else:
+        st.info("No entries yet.")
+    c1, c2, c3 = st.columns([1, 2, 1])
+    if c1.button("⬅️ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    c2.caption(f"Page {len(cursors)}")
+    if c3.button("Older ➡️", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
 
 # =========================================================
 #  ZONE 8: ADMIN PANEL (UPDATED)
 # =========================================================
-elif menu == "👑 Admin Panel" and is_admin:
+@metrics.timed("zone:admin")
+def admin_zone():
+    if not is_admin: return
     st.title("👑 Monarch's Decree")
     
     target_user = st.selectbox("Select Target User", user_list)
-    target_data = all_data.get(target_user, init_user_data(target_user))
+    target_base = get_store().load_user(target_user, skip=LAZY_FIELDS) or {k: v for k, v in init_user_data(target_user).items() if k not in LAZY_FIELDS}
+    # The tabs only edit the habit and shop views, which with_views builds fresh; everything else is read.
+    target_data = with_views(target_user, target_base)
+    cache = get_store().stats()
+    st.caption(f"🗄️ Save cache: {cache['hits']} hits / {cache['misses']} misses (v{cache['version']}) | {cache['conflicts']} merged conflicts")
     
-    tab1, tab2, tab3 = st.tabs(["📝 Assign Task", "💰 Manage Market", "✏️ Edit Habits"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["📝 Assign Task", "💰 Manage Market", "✏️ Edit Habits", "📈 Performance", "🗄️ Task Archive", "🏰 Guilds", "💾 Backups"])
     
     with tab1:
         with st.form("assign_task"):
             t_name = st.text_input("Task Name (e.g. Mow Lawn)")
             t_stat = st.selectbox("Stat Reward", list(target_data["xp"].keys()))
             t_due = st.date_input("Due Date", value=datetime.date.today())
+            t_users = st.multiselect("Assign To", user_list, default=[target_user])
             if st.form_submit_button("Assign Task"):
-                target_data["one_time_tasks"].append({
-                    "name": t_name, 
-                    "stat": t_stat, 
-                    "done": False,
-                    "due_date": str(t_due)
-                })
-                admin_save_target_user(target_user, target_data)
-                st.success(f"Assigned '{t_name}' to {target_user} due {t_due}!")
+                # One task per assignee, committed together in a single batched save.
+                updates, bases = {}, {}
+                for u in t_users:
+                    bases[u] = get_store().load_user(u) or init_user_data(u)
+                    updates[u] = dict(bases[u], one_time_tasks=list(bases[u]["one_time_tasks"]))
+                    tasks.add_task(updates[u]["one_time_tasks"], tasks.new_task(t_name, t_stat, t_due))
+                get_store().save_many(updates, bases)
+                st.success(f"Assigned '{t_name}' to {', '.join(t_users)} due {t_due}!")
+
+        st.subheader("🔁 Recurring Chores")
+        rulebook = get_guild().rules()
+        st.caption(f"Planned as quests up to {rules.WINDOW_DAYS} days ahead; the daily rollover plans the next day.")
+        for rule_id, rule in rulebook.load().items():
+            c1, c2 = st.columns([5, 1])
+            c1.info(" | ".join(str(v) for v in rules.describe(rule).values() if v))
+            if c2.button("🗑️", key=f"del_rule_{rule_id}"):
+                rulebook.remove(rule_id, get_store())
+                st.rerun()
+        with st.form("new_rule"):
+            r_name = st.text_input("Chore (e.g. Take Out Trash)")
+            r_stat = st.selectbox("Stat Reward", list(target_data["xp"].keys()), key="rule_stat")
+            r_users = st.multiselect("Assignees", user_list, default=[target_user], key="rule_users")
+            r_rotate = st.checkbox("Take turns (one assignee per occurrence, in this order)")
+            r_preset = st.selectbox("Repeats", list(rules.SCHEDULES) + ["Custom"])
+            r_custom = st.text_input("Custom schedule: day-of-month month day-of-week (e.g. `* * 2,4` for Tue/Thu)")
+            r_start = st.date_input("Starting", value=datetime.date.today(), key="rule_start")
+            if st.form_submit_button("Add Chore"):
+                try:
+                    rule = rules.new_rule(r_name, r_stat, rules.SCHEDULES.get(r_preset, r_custom), r_users, r_rotate, r_start)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    # Assignees who never logged in get a fresh record, as Assign Task does.
+                    added = rulebook.add(rule, get_store(), new_record=init_user_data, archive=get_archive())
+                    st.success(f"Added '{r_name}': {added} quests planned so far.")
     
     with tab2:
         st.write(f"Editing Market for: **{target_user}**")
@@ -680,7 +953,7 @@ elif menu == "👑 Admin Panel" and is_admin:
             if items_to_del:
                 for it in items_to_del:
                     del target_data["shop"][it]
-                admin_save_target_user(target_user, target_data)
+                admin_save_target_user(target_user, target_data, target_base)
                 st.rerun()
         else:
             st.warning("Market is empty.")
@@ -692,7 +965,7 @@ elif menu == "👑 Admin Panel" and is_admin:
             s_price = st.number_input("Gold Cost", min_value=10, step=10)
             if st.form_submit_button("Stock Market"):
                 target_data["shop"][s_name] = s_price
-                admin_save_target_user(target_user, target_data)
+                admin_save_target_user(target_user, target_data, target_base)
                 st.success(f"Added '{s_name}' to {target_user}'s Market!")
                 st.rerun()
                 
@@ -709,7 +982,7 @@ elif menu == "👑 Admin Panel" and is_admin:
         if habits_to_delete:
             for h in habits_to_delete:
                 del target_data["habits"][h]
-            admin_save_target_user(target_user, target_data)
+            admin_save_target_user(target_user, target_data, target_base)
             st.rerun()
             
         st.divider()
@@ -718,6 +991,155 @@ elif menu == "👑 Admin Panel" and is_admin:
             h_stat = st.selectbox("Attribute", ["Strength", "Agility", "Vitality", "Intellect", "Spirit", "Sense"])
             if st.form_submit_button("Create Habit"):
                 target_data["habits"][h_name] = [h_stat, None]
-                admin_save_target_user(target_user, target_data)
+                admin_save_target_user(target_user, target_data, target_base)
                 st.success(f"Created habit: {h_name}")
                 st.rerun()
+
+    with tab4:
+        metrics.enabled = st.toggle("Record timings (all sessions)", value=metrics.enabled)
+        st.caption(f"p50/p95 over the last {metrics.WINDOW} runs of each section.")
+        perf = metrics.summary()
+        if perf:
+            st.dataframe(pd.DataFrame(perf), hide_index=True, use_container_width=True)
+        else:
+            st.info("No samples yet. Turn on recording and use the app.")
+        sizes = metrics.gauges()
+        if sizes:
+            st.dataframe(pd.DataFrame(sizes), hide_index=True, use_container_width=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("⬇️ Prometheus", metrics.prometheus_text(), file_name="lifequest.prom")
+        c2.download_button("⬇️ JSON Lines", metrics.json_lines(), file_name="lifequest_metrics.jsonl")
+
+    with tab5:
+        st.write(f"Finished tasks for: **{target_user}**")
+        if st.session_state.get("archive_user") != target_user:
+            st.session_state.archive_user = target_user
+            st.session_state.archive_cursors = [None]
+        cursors = st.session_state.archive_cursors
+        page, next_cursor = get_archive().page(target_user, limit=25, cursor=cursors[-1])
+        if page:
+            st.dataframe(pd.DataFrame([tasks.describe(e) for e in page]), hide_index=True, use_container_width=True)
+        else:
+            st.info("No finished tasks yet.")
+        c1, c2, c3 = st.columns([1, 2, 1])
+        if c1.button("⬅️ Newer", key="archive_newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        c2.caption(f"Page {len(cursors)}")
+        if c3.button("Older ➡️", key="archive_older", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    with tab6:
+        guild = get_guild()
+        shards = get_guilds().stats()
+        st.write(f"Members of **{guild.name}**")
+        st.caption(f"🏰 {shards['open']} guild shards open in this process | {shards['evictions']} closed while idle")
+        st.dataframe(pd.DataFrame([{"Member": m, "Archetype": t} for m, t in guild.members.items()]), hide_index=True, use_container_width=True)
+        with st.form("add_member"):
+            m_name = st.text_input("New Member Name")
+            m_template = st.selectbox("Archetype", list(guild.templates))
+            if st.form_submit_button("Add Member"):
+                if not m_name.strip() or m_name.strip() in guild.members:
+                    st.error("Pick a new, non-empty name.")
+                else:
+                    get_guilds().add_member(guild.slug, m_name.strip(), m_template)
+                    st.rerun()
+        st.divider()
+        st.write("Found a new guild for another household:")
+        with st.form("new_guild"):
+            g_name = st.text_input("Guild Name (e.g. The Smiths)")
+            g_members = st.text_area("Members, one per line as Name = Archetype", placeholder="\n".join(f"Name = {t}" for t in guild.templates))
+            if st.form_submit_button("Found Guild"):
+                members = {}
+                for line in g_members.splitlines():
+                    name, _, template = (part.strip() for part in line.partition("="))
+                    if name: members[name] = template or next(iter(guild.templates))
+                unknown = sorted(set(members.values()) - set(guild.templates))
+                if not g_name.strip() or not members:
+                    st.error("A guild needs a name and at least one member.")
+                elif unknown:
+                    st.error(f"Unknown archetypes: {', '.join(unknown)}")
+                else:
+                    new_guild = get_guilds().create(g_name.strip(), members)
+                    st.success(f"Founded {new_guild.name} with {len(members)} members. Pick it under Select Guild.")
+
+    with tab7:
+        backups = backup.BackupSet(get_guild().path(guilds.BACKUP_DIR))
+        st.write("Compressed snapshots of this guild: records, event log, task archive and catalog.")
+        st.caption("Restore from a shell: `python backup.py restore --guild <guild dir>` (verifies the whole chain first).")
+        c1, c2 = st.columns(2)
+        run_full = c1.button("💾 Full Backup", key="backup_full")
+        # Without an earlier backup to build on, the incremental one comes out full.
+        run_incr = c2.button("➕ Incremental Backup", key="backup_incr")
+        if run_full or run_incr:
+            path, count = backups.run(get_guild(), STORAGE_BACKEND, full=run_full)
+            st.success(f"Wrote {count} items to {os.path.basename(path)}")
+        chain = set(backups.chain())
+        files = [{"Backup": os.path.basename(p), "KB": round(os.path.getsize(p) / 1024, 1), "In Restore Chain": p in chain}
+                 for p in backups.files()[::-1]]
+        if files:
+            st.dataframe(pd.DataFrame(files), hide_index=True, use_container_width=True)
+        else:
+            st.info("No backups yet.")
+
+# =========================================================
+#  ZONE 9: ANALYTICS
+# =========================================================
+@metrics.timed("zone:analytics")
+def analytics_zone():
+    st.title("📈 Progress Analytics")
+    user = st.session_state.current_user
+    # Memoized on the record version and the event log, so charts recompute only after new activity.
+    report = analytics.report(get_store(), get_events(), user, record_version(user), get_events().change_token(user))
+
+    t_xp, t_gold, t_habits, t_lifts = st.tabs(["⭐ XP", "💰 Gold", "🔁 Habits", "🏋️ Lifts"])
+    with t_xp:
+        st.caption("Cumulative XP per stat, by week")
+        if report["xp"].empty: st.info("No XP earned yet.")
+        else: st.line_chart(report["xp"])
+    with t_gold:
+        st.caption("Gold earned vs spent, by month")
+        if report["gold"].empty: st.info("No gold activity yet.")
+        else: st.bar_chart(report["gold"], stack=False)
+    with t_habits:
+        if report["habits"].empty: st.info("No habits completed yet.")
+        else: st.dataframe(report["habits"], hide_index=True, use_container_width=True)
+    with t_lifts:
+        metric = st.radio("Metric", ["Tonnage (lbs)", "Estimated 1RM (lbs)"], horizontal=True)
+        trend = report["tonnage"] if metric.startswith("Tonnage") else report["e1rm"]
+        if trend.empty:
+            st.info("Log weights in the Gym to see lift trends.")
+        else:
+            top = trend.count().sort_values(ascending=False).index[:5].tolist()
+            picked = st.multiselect("Exercises", list(trend.columns), default=top)
+            if picked: st.line_chart(trend[picked])
+
+# --- ZONE DISPATCH ---
+ZONES = {
+    "🏠 Dashboard": dashboard_zone,
+    "🔥 Quest Board": quest_board_zone,
+    "💰 Market": market_zone,
+    "🎒 Inventory": inventory_zone,
+    "🌳 Legacy Skills": skills_zone,
+    "🏋️ Gym": gym_zone,
+    "📜 History": history_zone,
+    "📈 Analytics": analytics_zone,
+    "👑 Admin Panel": admin_zone,
+}
+FRAGMENT_ZONES = {"🔥 Quest Board", "💰 Market", "🎒 Inventory", "🏋️ Gym"}
+
+if menu not in FRAGMENT_ZONES:
+    draw_sidebar_stats()
+ZONES[menu]()
+
+# Sizes are sampled once per full rerun, only while metrics are on.
+if metrics.enabled:
+    for name in (guilds.SAVE_FILE, guilds.SAVE_FILE + ".journal", guilds.DB_FILE, guilds.DB_FILE + "-wal"):
+        path = get_guild().path(name)
+        if os.path.exists(path): metrics.gauge("file_bytes", os.path.getsize(path), file=path)
+    user_keys = init_user_data("temp").keys()
+    session_user_data = {k: v for k, v in st.session_state.items() if k in user_keys}
+    metrics.gauge("session_state_bytes", metrics.deep_sizeof(session_user_data), user=st.session_state.current_user)
+    for stat, value in get_store().stats().items():
+        metrics.gauge(f"cache_{stat}", value)
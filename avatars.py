@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+
+from PIL import Image
+
+import storage
+
+# --- AVATAR THUMBNAILS ---
+# The rank portraits in assets/ are ~1 MB PNGs shown in a ~300 px sidebar. Once
+# per process, every role x rank portrait is resized to a small WebP named after
+# a hash of its source bytes and the thumbnail settings, and the (role, rank) ->
+# thumbnail lookup is kept in memory. A rerun then resolves the avatar with a
+# dict lookup, without touching the filesystem. Hashed names never change for
+# the same picture and a redrawn portrait gets a new URL. Streamlit's app/static
+# route sends no Cache-Control, only Last-Modified, so browsers keep a thumbnail
+# for a heuristic while rather than for good.
+THUMB_WIDTH = 480  # 2x the sidebar width, sharp on phones
+THUMB_QUALITY = 80
+THUMB_EXT = "webp"
+MANIFEST_FILE = "manifest.json"  # source stat token -> thumbnail name, so restarts skip re-hashing
+FALLBACK_SUFFIX = "rank_e"
+
+def thumb_name(source_path):
+    digest = hashlib.sha1(f"{THUMB_WIDTH}:{THUMB_QUALITY}:".encode("utf-8"))
+    with open(source_path, "rb") as f:
+        digest.update(f.read())
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return f"{stem}.{digest.hexdigest()[:12]}.{THUMB_EXT}"
+
+def make_thumbnail(source_path, out_path):
+    with Image.open(source_path) as image:
+        image.thumbnail((THUMB_WIDTH, THUMB_WIDTH * 4))
+        tmp = out_path + ".tmp"
+        image.save(tmp, "WEBP", quality=THUMB_QUALITY, method=6)
+    os.replace(tmp, out_path)
+
+class AvatarIndex:
+    def __init__(self, assets_dir, out_dir, prefixes, suffixes):
+        self.assets_dir = assets_dir
+        self.out_dir = out_dir
+        self.prefixes = list(prefixes)
+        self.suffixes = list(suffixes)
+        self.thumbs = {}  # (prefix, suffix) -> thumbnail file name
+        self.built = 0
+
+    def build(self):
+        # Stats each portrait once; only new or changed ones are hashed and resized.
+        os.makedirs(self.out_dir, exist_ok=True)
+        manifest_path = os.path.join(self.out_dir, MANIFEST_FILE)
+        with storage.file_lock(manifest_path):
+            try:
+                with open(manifest_path, "r") as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, ValueError):
+                manifest = {}
+            updated = {}
+            for prefix in self.prefixes:
+                for suffix in self.suffixes:
+                    source = os.path.join(self.assets_dir, f"{prefix}_{suffix}.png")
+                    token = storage.stat_token(source)
+                    if token is None:
+                        continue
+                    entry = manifest.get(source)
+                    if not entry or entry["token"] != list(token) or not os.path.exists(os.path.join(self.out_dir, entry["thumb"])):
+                        entry = {"token": list(token), "thumb": thumb_name(source)}
+                        if not os.path.exists(os.path.join(self.out_dir, entry["thumb"])):
+                            make_thumbnail(source, os.path.join(self.out_dir, entry["thumb"]))
+                            self.built += 1
+                    updated[source] = entry
+                    self.thumbs[(prefix, suffix)] = entry["thumb"]
+            if updated != manifest:
+                storage.atomic_write_json(manifest_path, updated)
+                # Thumbnails of redrawn portraits are dropped; their old URLs simply stop resolving.
+                keep = {entry["thumb"] for entry in updated.values()}
+                for name in os.listdir(self.out_dir):
+                    if name.endswith("." + THUMB_EXT) and name not in keep:
+                        os.remove(os.path.join(self.out_dir, name))
+        return self
+
+    def thumb(self, prefix, suffix):
+        # File name of the portrait, or of the role's first rank when that one is missing.
+        return self.thumbs.get((prefix, suffix)) or self.thumbs.get((prefix, FALLBACK_SUFFIX))
+
+    def path(self, name):
+        return os.path.join(self.out_dir, name)
+
+_indexes = {}
+_open_lock = threading.Lock()
+
+def open_index(assets_dir, out_dir, prefixes, suffixes):
+    with _open_lock:
+        key = os.path.abspath(out_dir)
+        if key not in _indexes:
+            _indexes[key] = AvatarIndex(assets_dir, out_dir, prefixes, suffixes).build()
+        return _indexes[key]
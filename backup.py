@@ -0,0 +1,264 @@
+import argparse
+import datetime
+import gzip
+import json
+import os
+import re
+import sys
+import zlib
+
+import guilds
+import storage
+
+# --- BACKUP FORMAT ---
+# A backup is gzip-compressed NDJSON, written and read one line at a time:
+#   {"type": "header", "format": 1, "guild": ..., "created": ..., "incremental": bool}
+#   {"type": "file", "name": "catalog.json", "data": {...}}           small guild-wide files
+#   {"type": "record", "user": ..., "record": {...}}                   one per changed user
+#   {"type": "event", "log": "events", "user": ..., "month": ..., "offset": ..., "event": {...}}
+#   {"type": "end", "count": N}                                        absent if the file is truncated
+# Event partitions are append-only, so an event's byte offset in its partition
+# is stable. The watermark of a backup is every user's record version plus the
+# end offset of every partition; an incremental holds only what lies past it.
+FORMAT = 1
+LOGS = ("events", "archive")  # Guild methods returning each EventLog
+SIDE_FILES = (guilds.GUILD_FILE, guilds.CATALOG_FILE, guilds.RULES_FILE)
+WATERMARK_FILE = "watermark.json"
+RESTORE_BATCH = 50  # records or events held in memory before they are written
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+class BackupError(ValueError):
+    pass
+
+def _write(f, item):
+    f.write(json.dumps(item) + "\n")
+
+def write_backup(guild, kind, path, since=None):
+    # Streams the guild to `path` (replaced atomically); since=None is a full backup.
+    # Returns (watermark, items written).
+    incremental = since is not None
+    since = since or {"records": {}, "logs": {}}
+    watermark = {"records": {}, "logs": {name: {} for name in LOGS}}
+    all_data = guild.store(kind).load_all()
+    members = list(dict.fromkeys(list(all_data) + list(guild.members)))
+    count = 0
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        _write(f, {"type": "header", "format": FORMAT, "guild": guild.slug,
+                   "created": datetime.datetime.now().isoformat(timespec="seconds"), "incremental": incremental})
+        for name in SIDE_FILES:
+            if os.path.exists(guild.path(name)):
+                with open(guild.path(name), "r") as side:
+                    _write(f, {"type": "file", "name": name, "data": json.load(side)})
+                count += 1
+        for username in members:
+            record = all_data.get(username)
+            if record is None:
+                continue
+            version = watermark["records"][username] = record.get(storage.VERSION_KEY, 0)
+            if version > since["records"].get(username, -1):
+                # Legacy JSON records predate versioning; stamp the version the watermark took.
+                _write(f, {"type": "record", "user": username, "record": dict(record, **{storage.VERSION_KEY: version})})
+                count += 1
+        for name in LOGS:
+            log = getattr(guild, name)()
+            for username in members:
+                done = since["logs"].get(name, {}).get(username, {})
+                marks = watermark["logs"][name][username] = {}
+                for month, part in zip(log.partitions(username), log.partition_paths(username)):
+                    offset = done.get(month, 0)
+                    if os.path.getsize(part) < offset:
+                        offset = 0  # the partition was recreated; take it whole
+                    with open(part, "rb") as src:
+                        src.seek(offset)
+                        for raw in src:
+                            if not raw.endswith(b"\n"):
+                                break  # an append in flight; the next backup picks it up
+                            if raw.strip():
+                                _write(f, {"type": "event", "log": name, "user": username, "month": month,
+                                           "offset": offset, "event": json.loads(raw)})
+                                count += 1
+                            offset += len(raw)
+                    marks[month] = offset
+        _write(f, {"type": "end", "count": count})
+    os.replace(tmp, path)
+    return watermark, count
+
+# --- VALIDATION ---
+_FIELDS = {
+    "file": {"name": str, "data": dict},
+    "record": {"user": str, "record": dict},
+    "event": {"log": str, "user": str, "month": str, "offset": int, "event": dict},
+}
+
+def _problem(item):
+    fields = _FIELDS.get(item.get("type"))
+    if fields is None:
+        return f"unknown item type {item.get('type')!r}"
+    for field, expected in fields.items():
+        if not isinstance(item.get(field), expected):
+            return f"{item['type']} item without a valid {field!r}"
+    if item["type"] == "file" and item["name"] not in SIDE_FILES:
+        return f"unexpected file {item['name']!r}"
+    if item["type"] == "record" and not isinstance(item["record"].get(storage.VERSION_KEY), int):
+        return f"record of {item['user']!r} has no {storage.VERSION_KEY}"
+    if item["type"] == "event" and (item["log"] not in LOGS or not _MONTH.match(item["month"])):
+        return f"event of {item['user']!r} has a bad log or month"
+    return None
+
+def read_backup(path):
+    # Yields the header and then each item; raises BackupError on a corrupt, truncated or foreign file.
+    count = 0
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    raise BackupError(f"{path}:{n}: not a JSON line")
+                if n == 1:
+                    if item.get("type") != "header" or item.get("format") != FORMAT:
+                        raise BackupError(f"{path}: not a format {FORMAT} backup")
+                    yield item
+                    continue
+                if item.get("type") == "end":
+                    if item.get("count") != count or next(f, None) is not None:
+                        raise BackupError(f"{path}: end marker does not match the contents")
+                    return
+                problem = _problem(item)
+                if problem:
+                    raise BackupError(f"{path}:{n}: {problem}")
+                count += 1
+                yield item
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError) as e:
+        raise BackupError(f"{path}: {e}") from e
+    raise BackupError(f"{path}: truncated, no end marker")
+
+def verify(paths):
+    # Reads every file of a chain through; returns the number of items. Holds one line at a time.
+    total = 0
+    for i, path in enumerate(paths):
+        for item in read_backup(path):
+            if item["type"] == "header":
+                if i == 0 and item["incremental"]:
+                    raise BackupError(f"{path}: a restore must start from a full backup")
+            else:
+                total += 1
+    return total
+
+# --- RESTORE ---
+def _flush_records(store, batch):
+    # Backups replace what is there: each record is saved over the current version, without merging.
+    current = store.load_all()
+    store.save_many({u: dict(r, **{storage.VERSION_KEY: (current.get(u) or {}).get(storage.VERSION_KEY, 0)})
+                     for u, r in batch.items()})
+    batch.clear()
+
+def _flush_events(guild, batch):
+    for (name, username), new_events in batch.items():
+        getattr(guild, name)().extend(username, new_events)
+    batch.clear()
+
+def restore(guild, kind, paths):
+    # Restores a full backup plus the incrementals taken after it, in order. The whole chain
+    # is verified before anything is written. Events already present at their offset are
+    # skipped, so restoring twice, or onto a log that survived, adds no duplicates.
+    if not paths:
+        raise BackupError("nothing to restore")
+    total = verify(paths)
+    store = guild.store(kind)
+    os.makedirs(guild.root, exist_ok=True)
+    records, pending, sizes = {}, {}, {}
+    for path in paths:
+        for item in read_backup(path):
+            if item["type"] == "file":
+                storage.atomic_write_json(guild.path(item["name"]), item["data"])
+            elif item["type"] == "record":
+                records[item["user"]] = item["record"]
+                if len(records) >= RESTORE_BATCH:
+                    _flush_records(store, records)
+            elif item["type"] == "event":
+                part = (item["log"], item["user"], item["month"])
+                if part not in sizes:
+                    token = storage.stat_token(getattr(guild, item["log"])().partition_path(item["user"], item["month"]))
+                    sizes[part] = token[1] if token else 0
+                if item["offset"] >= sizes[part]:
+                    pending.setdefault((item["log"], item["user"]), []).append(item["event"])
+                    if sum(map(len, pending.values())) >= RESTORE_BATCH:
+                        _flush_events(guild, pending)
+    if records:
+        _flush_records(store, records)
+    _flush_events(guild, pending)
+    return total
+
+# --- BACKUP SETS ---
+# One directory per guild: a full backup, the incrementals taken after it and
+# the watermark of the newest one. Names sort in the order they were taken.
+class BackupSet:
+    def __init__(self, root):
+        self.root = root
+
+    def watermark(self):
+        try:
+            with open(os.path.join(self.root, WATERMARK_FILE), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def files(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.join(self.root, n) for n in os.listdir(self.root) if n.endswith(".ndjson.gz"))
+
+    def chain(self):
+        # The newest full backup and every incremental after it: what a restore needs.
+        files = self.files()
+        fulls = [i for i, path in enumerate(files) if path.endswith("-full.ndjson.gz")]
+        return files[fulls[-1]:] if fulls else []
+
+    def run(self, guild, kind, full=False):
+        # Incremental when a watermark exists, unless `full`. Returns (path, items written).
+        os.makedirs(self.root, exist_ok=True)
+        watermark_path = os.path.join(self.root, WATERMARK_FILE)
+        with storage.file_lock(watermark_path):
+            since = None if full else self.watermark()
+            # The zero-padded counter keeps same-second backups in name order, whichever their kind.
+            stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+            taken = os.listdir(self.root)
+            n = 1
+            while any(name.startswith(f"{stamp}-{n:02d}-") for name in taken):
+                n += 1
+            path = os.path.join(self.root, f"{stamp}-{n:02d}-{'incr' if since else 'full'}.ndjson.gz")
+            watermark, count = write_backup(guild, kind, path, since)
+            storage.atomic_write_json(watermark_path, watermark)
+        return path, count
+
+def _cli_guild(root):
+    slug = guilds.DEFAULT_GUILD if os.path.abspath(root) == os.path.abspath(os.curdir) else os.path.basename(os.path.abspath(root))
+    try:
+        with open(os.path.join(root, guilds.GUILD_FILE), "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    return guilds.Guild(slug, root, config)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up, verify or restore one guild.")
+    parser.add_argument("command", choices=["backup", "verify", "restore"])
+    parser.add_argument("files", nargs="*", help="backup files (default: the newest chain in the guild's backups/)")
+    parser.add_argument("--guild", default=os.curdir, help="guild directory (default: the working directory)")
+    parser.add_argument("--backend", default=os.environ.get("LIFEQUEST_STORAGE", "sqlite"), choices=sorted(storage.BACKENDS))
+    parser.add_argument("--full", action="store_true", help="take a full backup even if a watermark exists")
+    args = parser.parse_args()
+    guild = _cli_guild(args.guild)
+    backups = BackupSet(guild.path(guilds.BACKUP_DIR))
+    try:
+        if args.command == "backup":
+            path, count = backups.run(guild, args.backend, full=args.full)
+            print(f"Wrote {count} items to {path}")
+        elif args.command == "verify":
+            print(f"OK: {verify(args.files or backups.chain())} items")
+        else:
+            print(f"Restored {restore(guild, args.backend, args.files or backups.chain())} items; take a full backup next")
+    except BackupError as e:
+        sys.exit(f"backup: {e}")
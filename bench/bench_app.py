@@ -0,0 +1,175 @@
+# Headless benchmark for app.py versus guild size. Generates synthetic guilds,
+# drives the real script through Streamlit's AppTest runner and times the
+# persistence hot paths directly. Run from the repo root:
+#   python bench/bench_app.py [--scales 4x1,4x3,16x5] [--backend sqlite] [--out bench_results.json]
+# Each scale is USERSxYEARS of daily activity. Every run appends one JSON line
+# (git revision + per-scale results) so runs can be diffed across commits.
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import events
+import inventory
+import storage
+
+FAMILY = ["👨‍✈️ Dad (Monarch)", "👩‍⚕️ Mom (Healer)", "🔮 Daughter (15) (Caster)", "🛡️ Son (10) (Tank)"]
+STATS = ["Strength", "Intellect", "Vitality", "Agility", "Sense", "Spirit"]
+ZONE_REPEATS = 3
+
+# --- SYNTHETIC GUILDS ---
+def synth_user(rng, years):
+    days = int(years * 365)
+    start = datetime.date.today() - datetime.timedelta(days=days)
+    dates = [(start + datetime.timedelta(days=d)).isoformat() for d in range(days)]
+    workouts = [{
+        "date": day, "day_name": "Day", "current_step": 5,
+        "exercises": [{"name": f"Lift {j}", "sets": "3", "reps": "5", "trainer_note": "", "my_weight": str(rng.randint(45, 315)),
+                       "my_notes": "", "sets_completed": 3} for j in range(5)],
+    } for day in dates[::3]]
+    # Finished chores live in the task archive, so a record only carries the open ones.
+    tasks = [{"id": f"chore{i}", "name": f"Chore {i}", "stat": rng.choice(STATS), "done": False, "due_date": dates[min(i * 4, days - 1)]}
+             for i in range(max(0, days // 4 - 5), days // 4)]
+    return {
+        "xp": {s: rng.randint(0, 5000 * max(years, 1)) for s in STATS},
+        "attributes": {"HP": 100, "Max_HP": 100, "Gold": rng.randint(0, 5000)},
+        "habit_overrides": {f"Habit {k}": [STATS[k], None] for k in range(4)},
+        "shop_overrides": {"🍦 Ice Cream": 120},
+        "one_time_tasks": tasks,
+        "skill_overrides": {"🛡️ Guardian (Safety)": {"Situational Awareness": {"status": "Mastered"}}},
+        "workout_queue": {},
+        "active_workout": None,
+        "workout_history": workouts,
+        "inventory": {inventory.item_id("🍦 Ice Cream"): {"name": "🍦 Ice Cream", "count": 5}},
+        "inventory_bought": {inventory.item_id("🍦 Ice Cream"): [int(time.time())] * 5},
+        "weight_log": {"dates": dates, "weights": [round(rng.uniform(150, 220), 1) for _ in dates]},
+        "last_login": datetime.date.today().isoformat(),
+    }, [events.make_event("habit", f"Habit {d % 4}", xp={STATS[d % 6]: 15}, gold=5,
+                          when=datetime.datetime.combine(start + datetime.timedelta(days=d // 5), datetime.time(8)))
+        for d in range(days * 5)]
+
+def build_guild(workdir, backend, n_users, years, seed=0):
+    rng = random.Random(seed)
+    names = FAMILY + [f"Guest {i}" for i in range(max(0, n_users - len(FAMILY)))]
+    path = os.path.join(workdir, "save_data.db" if backend == "sqlite" else "save_data.json")
+    store = storage.CachedStore(storage.BACKENDS[backend](path))
+    log = events.EventLog(os.path.join(workdir, "events"))
+    for name in names[:n_users]:
+        record, user_events = synth_user(rng, years)
+        store.save_user(name, record)
+        log.extend(name, user_events)
+    return path
+
+# --- MEASUREMENTS ---
+def write_bytes():
+    # Bytes this process handed to write(); falls back to 0 where /proc is missing.
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("wchar"))
+    except (OSError, StopIteration):
+        return 0
+
+def timed(fn, repeats=5):
+    samples = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "max_ms": round(max(samples), 3)}
+
+def bench_persistence(path, backend):
+    results = {}
+    results["load_all_cold"] = timed(lambda: storage.CachedStore(storage.BACKENDS[backend](path)).load_all())
+    store = storage.CachedStore(storage.BACKENDS[backend](path))
+    store.load_all()
+    results["load_all_warm"] = timed(store.load_all, repeats=50)
+
+    user = FAMILY[-1]
+    def habit_click():
+        record = store.load_user(user)
+        base = copy.deepcopy(record)
+        record["attributes"]["Gold"] += 5
+        record["xp"]["Spirit"] += 15
+        store.save_user(user, record, base=base)
+    before = write_bytes()
+    results["save_user_habit"] = timed(habit_click, repeats=20)
+    results["save_user_habit"]["bytes_written_per_save"] = (write_bytes() - before) // 20
+    results["save_file_bytes"] = sum(os.path.getsize(p) for p in (path, path + "-wal", path + ".journal") if os.path.exists(p))
+    return results
+
+def bench_app(workdir, backend):
+    from streamlit.testing.v1 import AppTest
+    os.environ["LIFEQUEST_STORAGE"] = backend
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        t = time.perf_counter()
+        at = AppTest.from_file(os.path.join(workdir, "app.py"), default_timeout=600).run()
+        cold = (time.perf_counter() - t) * 1000
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        zones = {}
+        for zone in at.sidebar.radio[0].options:
+            at.sidebar.radio[0].set_value(zone).run()
+            zones[zone] = timed(at.run, repeats=ZONE_REPEATS)
+            if at.exception:
+                raise RuntimeError(f"{zone}: {at.exception[0].message}")
+        return {"cold_start_ms": round(cold, 3), "zone_rerun": zones}
+    finally:
+        os.chdir(cwd)
+
+def run_scale(backend, n_users, years, skip_app):
+    workdir = tempfile.mkdtemp(prefix="lifequest-bench-")
+    try:
+        for name in os.listdir(REPO):
+            if name.endswith(".py"):
+                shutil.copy(os.path.join(REPO, name), workdir)
+        # Custom components and .streamlit/config.toml (static serving) are part of the production path too.
+        for name in ("assets", "components", ".streamlit"):
+            shutil.copytree(os.path.join(REPO, name), os.path.join(workdir, name))
+        t = time.perf_counter()
+        path = build_guild(workdir, backend, n_users, years)
+        result = {"scale": f"{n_users}x{years:g}", "users": n_users, "years": years, "backend": backend,
+                  "setup_s": round(time.perf_counter() - t, 2)}
+        result.update(bench_persistence(path, backend))
+        if not skip_app:
+            result.update(bench_app(workdir, backend))
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="4x1,4x3,16x3", help="comma-separated USERSxYEARS")
+    parser.add_argument("--backend", choices=sorted(storage.BACKENDS), default="sqlite")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--skip-app", action="store_true", help="only time the storage layer")
+    args = parser.parse_args()
+
+    run = {"revision": git_revision(), "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+           "python": platform.python_version(), "results": []}
+    for scale in args.scales.split(","):
+        n_users, years = scale.lower().split("x")
+        result = run_scale(args.backend, int(n_users), float(years), args.skip_app)
+        run["results"].append(result)
+        print(json.dumps(result, ensure_ascii=False))
+    with open(args.out, "a") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+    print(f"Appended results to {args.out}")
@@ -0,0 +1,71 @@
+# Hammers the save path from several threads and processes at once and checks
+# that no update was lost. Run from the repo root:
+#   python bench/stress_saves.py [--backend sqlite|json] [--threads 4] [--procs 4] [--iterations 50]
+import argparse
+import copy
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+import tasks
+
+USER = "🛡️ Son (10) (Tank)"
+
+def hammer(store, worker, iterations):
+    for i in range(iterations):
+        user_data = store.load_user(USER)
+        base = copy.deepcopy(user_data)
+        user_data["attributes"]["Gold"] += 1
+        user_data["completed_history"].append(f"{worker}-{i}")
+        if i % 5 == 0:
+            # Admin-style edit on the same record: assign a task (inserted in due-date order).
+            tasks.add_task(user_data["one_time_tasks"], tasks.new_task(f"{worker}-{i}", "Spirit", f"2026-01-{i % 28 + 1:02d}"))
+        store.save_user(USER, user_data, base=base)
+
+def process_worker(kind, path, worker, iterations):
+    # Each process gets its own store, exactly like a second Streamlit server would.
+    hammer(storage.CachedStore(storage.BACKENDS[kind](path)), worker, iterations)
+
+def run(kind, n_threads, n_procs, iterations):
+    path = os.path.join(tempfile.mkdtemp(), "stress.db" if kind == "sqlite" else "stress.json")
+    store = storage.CachedStore(storage.BACKENDS[kind](path))
+    store.save_user(USER, {"attributes": {"Gold": 0}, "completed_history": [], "one_time_tasks": []})
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=process_worker, args=(kind, path, f"p{n}", iterations)) for n in range(n_procs)]
+    threads = [threading.Thread(target=hammer, args=(store, f"t{n}", iterations)) for n in range(n_threads)]
+    for worker in procs + threads:
+        worker.start()
+    for worker in procs + threads:
+        worker.join()
+    if any(p.exitcode != 0 for p in procs):
+        sys.exit("a worker process crashed")
+
+    final = storage.BACKENDS[kind](path).load_all()[USER]
+    workers = n_threads + n_procs
+    expected_history = {f"{w}-{i}" for w in [f"t{n}" for n in range(n_threads)] + [f"p{n}" for n in range(n_procs)] for i in range(iterations)}
+    errors = []
+    if final["attributes"]["Gold"] != workers * iterations:
+        errors.append(f"Gold {final['attributes']['Gold']} != {workers * iterations}")
+    if sorted(final["completed_history"]) != sorted(expected_history):
+        errors.append(f"history has {len(final['completed_history'])} entries, expected {len(expected_history)}")
+    expected_tasks = workers * len(range(0, iterations, 5))
+    if len(final["one_time_tasks"]) != expected_tasks:
+        errors.append(f"{len(final['one_time_tasks'])} tasks, expected {expected_tasks}")
+    print(f"{kind}: {workers} writers x {iterations} saves -> version {final[storage.VERSION_KEY]}, "
+          f"{store.conflicts} merged conflicts in-process, {'LOST UPDATES: ' + '; '.join(errors) if errors else 'no lost updates'}")
+    return not errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=sorted(storage.BACKENDS), action="append")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    ok = all([run(kind, args.threads, args.procs, args.iterations) for kind in args.backend or sorted(storage.BACKENDS)])
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,70 @@
+import bisect
+import functools
+
+import numpy as np
+import pandas as pd
+
+# --- BODY MASS SERIES ---
+# weight_log stays {"dates": [...], "weights": [...]} in the record, with one
+# entry per day. Charts read it once per record version into typed arrays
+# (datetime64[D] days, float32 weights) and pick the finest daily, weekly or
+# monthly view that fits in MAX_CHART_POINTS. The chart payload stays the same
+# size whether there is a month of weigh-ins or ten years.
+MAX_CHART_POINTS = 400
+ROLLING_DAYS = 7
+RESOLUTIONS = {"D": "Daily", "W": "Weekly average", "MS": "Monthly average"}
+
+def upsert(weight_log, day, weight):
+    # A second weigh-in on the same day replaces the first instead of adding a point.
+    dates, weights = weight_log["dates"], weight_log["weights"]
+    day = str(day)
+    if not dates or dates[-1] < day:
+        dates.append(day)
+        weights.append(weight)
+        return
+    # The day's last entry is the one charted when older saves hold duplicates.
+    i = bisect.bisect_right(dates, day) - 1
+    if i >= 0 and dates[i] == day:
+        weights[i] = weight
+    else:
+        dates.insert(i + 1, day)
+        weights.insert(i + 1, weight)
+
+class WeightSeries:
+    def __init__(self, dates, weights):
+        days = np.array(dates, dtype="datetime64[D]")
+        values = np.array(weights, dtype=np.float32)
+        # Older saves can be out of order or hold several weigh-ins a day; keep each day's last.
+        order = np.argsort(days, kind="stable")
+        days, values = days[order], values[order]
+        keep = np.append(days[1:] != days[:-1], True) if len(days) else np.zeros(0, dtype=bool)
+        self.days = days[keep]
+        self.values = values[keep]
+        self._views = {}
+
+    def __len__(self):
+        return len(self.days)
+
+    def view(self, resolution):
+        # Mean weight per period next to the trailing average, which is always taken over daily data.
+        if resolution not in self._views:
+            daily = pd.Series(self.values, index=pd.DatetimeIndex(self.days.astype("datetime64[ns]")))
+            frame = pd.DataFrame({"Weight": daily, f"{ROLLING_DAYS}-day avg": daily.rolling(f"{ROLLING_DAYS}D").mean()})
+            if resolution != "D":
+                frame = frame.resample(resolution).mean().dropna(how="all")
+            self._views[resolution] = frame.astype(np.float32)
+        return self._views[resolution]
+
+    def chart(self, max_points=MAX_CHART_POINTS):
+        # Returns (frame, resolution label) with at most max_points rows.
+        for resolution, label in RESOLUTIONS.items():
+            frame = self.view(resolution)
+            if len(frame) <= max_points:
+                return frame, label
+        return frame.iloc[-max_points:], label
+
+@functools.lru_cache(maxsize=32)
+def load_series(store, username, version):
+    # `version` (the record's) only keys the cache; reruns without a save reuse the arrays and views.
+    weight_log = (store.load_all().get(username) or {}).get("weight_log") or {"dates": [], "weights": []}
+    return WeightSeries(weight_log["dates"], weight_log["weights"])
@@ -0,0 +1,99 @@
+import copy
+import json
+import os
+import threading
+
+import storage
+
+# --- SHARED CATALOG ---
+# The skill tree and each archetype's habit/shop template are stored once in
+# catalog.json. A user's record keeps only overrides against them (mastered
+# skills, last-done dates, changed prices, added or removed entries), and the
+# full views a zone reads are merged from the two on load. Skills are
+# guild-wide; habits and shop are keyed by family template.
+REMOVED = None  # override value for a catalog entry this user no longer has
+_MISSING = object()
+
+def make_overlay(defaults, view):
+    overlay = {}
+    for key, value in view.items():
+        default = defaults.get(key, _MISSING)
+        if value == default:
+            continue
+        if isinstance(value, dict) and isinstance(default, dict):
+            overlay[key] = make_overlay(default, value)
+        else:
+            overlay[key] = copy.deepcopy(value)
+    overlay.update({key: REMOVED for key in defaults if key not in view})
+    return overlay
+
+def apply_overlay(defaults, overlay):
+    view = copy.deepcopy(defaults)
+    for key, value in overlay.items():
+        if value is REMOVED:
+            view.pop(key, None)
+        elif isinstance(value, dict) and isinstance(view.get(key), dict):
+            view[key] = apply_overlay(view[key], value)
+        else:
+            view[key] = copy.deepcopy(value)
+    return view
+
+class Catalog:
+    def __init__(self, path, defaults):
+        self.path = path
+        self.defaults = defaults
+        self.version = 0
+        self._data = None
+        self._token = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        # Read-only; revalidated with a stat() like the save cache.
+        with self._lock:
+            token = storage.stat_token(self.path)
+            if self._data is None or token != self._token:
+                if token is None:
+                    self._data = copy.deepcopy(self.defaults)
+                else:
+                    with open(self.path, "r") as f:
+                        self._data = json.load(f)
+                self._token = token
+                self.version += 1
+            return self._data
+
+    def entries(self, kind, template=None):
+        data = self.load()
+        return data[kind] if kind == "skills" else data[kind].get(template, {})
+
+    def view(self, kind, template, overlay):
+        return apply_overlay(self.entries(kind, template), overlay or {})
+
+    def overlay(self, kind, template, view):
+        return make_overlay(self.entries(kind, template), view)
+
+    def set_entry(self, kind, template, path, value):
+        # e.g. set_entry("skills", None, [category, skill], {...}) adds a skill for everyone.
+        with self._lock, storage.file_lock(self.path):
+            self._data = None
+            data = copy.deepcopy(self.load())
+            target = data[kind] if kind == "skills" else data[kind].setdefault(template, {})
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+            storage.atomic_write_json(self.path, data)
+            self._data, self._token = data, storage.stat_token(self.path)
+            self.version += 1
+
+_open_catalogs = {}
+_open_lock = threading.Lock()
+
+def open_catalog(path, defaults):
+    with _open_lock:
+        key = os.path.abspath(path)
+        if key not in _open_catalogs:
+            _open_catalogs[key] = Catalog(path, defaults)
+        return _open_catalogs[key]
+
+def close_catalog(path):
+    with _open_lock:
+        return _open_catalogs.pop(os.path.abspath(path), None)
@@ -0,0 +1,187 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+
+# --- EVENT RECORDS ---
+# One typed record per thing that happened to a character. Replaces the old
+# free-text completed_history strings like "2026-10-01 - Task: Mow Lawn (LATE) (+10 GP)".
+EVENT_KINDS = ["habit", "task", "skill", "dungeon", "purchase", "redeem", "penalty"]
+
+def make_event(kind, source, xp=None, gold=0, note="", when=None):
+    when = when or datetime.datetime.now()
+    return {
+        "ts": when.isoformat(timespec="seconds"),
+        "kind": kind,
+        "source": source,
+        "xp": xp or {},
+        "gold": gold,
+        "note": note,
+    }
+
+def describe(event):
+    xp = ", ".join(f"{v:+} {k}" for k, v in event["xp"].items())
+    return {
+        "When": event["ts"].replace("T", " ")[:16],
+        "Kind": event["kind"].title(),
+        "Source": event["source"] + (f" ({event['note']})" if event["note"] else ""),
+        "XP": xp,
+        "Gold": event["gold"],
+    }
+
+_LEGACY_KINDS = [("Task: ", "task"), ("Bought ", "purchase"), ("Mastered: ", "skill"), ("Cleared Dungeon", "dungeon")]
+# Legacy strings only carry an XP total; a dungeon claim always paid it out as 150 Strength + 50 Agility.
+_LEGACY_XP_SPLIT = {"dungeon": {"Strength": 150, "Agility": 50}}
+
+def parse_legacy_entry(text):
+    # "2026-10-01 - Task: Mow Lawn (LATE) (+10 GP)" -> task event worth +10 gold on 2026-10-01
+    date_str, _, rest = text.partition(" - ")
+    try:
+        when = datetime.datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        when, rest = datetime.datetime(1970, 1, 1), text
+    # Rewards sit anywhere in a parenthetical: "(+10 GP)", "(+200 XP | +50 GP)".
+    gold = total_xp = 0
+    for group in re.findall(r"\(([^)]*)\)", rest):
+        gold_match = re.search(r"([+-]\d+) GP", group)
+        xp_match = re.search(r"([+-]\d+) XP", group)
+        gold += int(gold_match.group(1)) if gold_match else 0
+        total_xp += int(xp_match.group(1)) if xp_match else 0
+    source = re.sub(r"\s*\([^)]*\)", "", rest).strip()
+    kind = "habit"
+    for prefix, prefix_kind in _LEGACY_KINDS:
+        if source.startswith(prefix):
+            kind, source = prefix_kind, source[len(prefix):] or source
+            break
+    xp = {}
+    if total_xp:
+        split = _LEGACY_XP_SPLIT.get(kind, {"XP": 1})
+        xp = {stat: total_xp * share // sum(split.values()) for stat, share in split.items()}
+    note = "LATE" if "(LATE)" in rest else ""
+    return make_event(kind, source, xp=xp, gold=gold, note=note, when=when)
+
+# --- TIME-PARTITIONED LOG ---
+# events/<user>/<YYYY-MM>.ndjson, appended one line per event. Readers open only
+# the months they need, newest first, so a page costs the same at any history size.
+class EventLog:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _user_dir(self, username):
+        slug = re.sub(r"[^a-z0-9]+", "-", username.lower()).strip("-")
+        digest = hashlib.sha1(username.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.root, f"{slug}-{digest}")
+
+    def append(self, username, event):
+        self.extend(username, [event])
+
+    def extend(self, username, new_events):
+        by_month = {}
+        for event in new_events:
+            by_month.setdefault(event["ts"][:7], []).append(json.dumps(event) + "\n")
+        user_dir = self._user_dir(username)
+        with self._lock:
+            os.makedirs(user_dir, exist_ok=True)
+            for month, lines in by_month.items():
+                # O_APPEND + one write per batch keeps concurrent appenders from interleaving lines.
+                fd = os.open(os.path.join(user_dir, f"{month}.ndjson"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, "".join(lines).encode("utf-8"))
+                finally:
+                    os.close(fd)
+
+    def extend_once(self, username, new_events, marker=".legacy_imported"):
+        # One-shot migration batch; the marker makes a repeat (a rerun before the record saved) a no-op.
+        marker = os.path.join(self._user_dir(username), marker)
+        if os.path.exists(marker):
+            return 0
+        self.extend(username, new_events)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, "w").close()
+        return len(new_events)
+
+    def import_legacy(self, username, history):
+        # One-shot conversion of completed_history strings.
+        return self.extend_once(username, sorted((parse_legacy_entry(h) for h in history), key=lambda e: e["ts"]))
+
+    def partitions(self, username):
+        user_dir = self._user_dir(username)
+        if not os.path.isdir(user_dir):
+            return []
+        return sorted(name[:-len(".ndjson")] for name in os.listdir(user_dir) if name.endswith(".ndjson"))
+
+    def partition_path(self, username, month):
+        return os.path.join(self._user_dir(username), f"{month}.ndjson")
+
+    def partition_paths(self, username):
+        return [self.partition_path(username, month) for month in self.partitions(username)]
+
+    def change_token(self, username):
+        # Changes whenever an event is appended to any month (catch-up penalties can land in older ones).
+        infos = [os.stat(path) for path in self.partition_paths(username)]
+        return (len(infos), sum(i.st_size for i in infos), max((i.st_mtime_ns for i in infos), default=0))
+
+    def _read_partition(self, username, month):
+        with open(self.partition_path(username, month), "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def page(self, username, limit=50, cursor=None, kinds=None, start=None, end=None):
+        # Newest first. `cursor` is the (month, index) returned by the previous page;
+        # returns (events, next_cursor) with next_cursor None on the last page.
+        months = self._months_in_range(username, start, end)[::-1]
+        if cursor:
+            months = [m for m in months if m <= cursor[0]]
+        found = []
+        for month in months:
+            partition = self._read_partition(username, month)
+            stop = cursor[1] if cursor and month == cursor[0] else len(partition)
+            for i in range(stop - 1, -1, -1):
+                event = partition[i]
+                if self._matches(event, kinds, start, end):
+                    if len(found) == limit:
+                        return found, [month, i + 1]
+                    found.append(event)
+        return found, None
+
+    def iter_events(self, username, start=None, end=None):
+        # Oldest first, for analytics.
+        for month in self._months_in_range(username, start, end):
+            for event in self._read_partition(username, month):
+                if self._matches(event, None, start, end):
+                    yield event
+
+    def _months_in_range(self, username, start, end):
+        months = self.partitions(username)
+        if start:
+            months = [m for m in months if m >= start.isoformat()[:7]]
+        if end:
+            months = [m for m in months if m <= end.isoformat()[:7]]
+        return months
+
+    @staticmethod
+    def _matches(event, kinds, start, end):
+        if kinds and event["kind"] not in kinds:
+            return False
+        day = event["ts"][:10]
+        if start and day < start.isoformat():
+            return False
+        if end and day > end.isoformat():
+            return False
+        return True
+
+_open_logs = {}
+_open_lock = threading.Lock()
+
+def open_log(root):
+    with _open_lock:
+        key = os.path.abspath(root)
+        if key not in _open_logs:
+            _open_logs[key] = EventLog(root)
+        return _open_logs[key]
+
+def close_log(root):
+    with _open_lock:
+        return _open_logs.pop(os.path.abspath(root), None)
@@ -0,0 +1,209 @@
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+import catalog
+import events
+import gym
+import rules
+import scheduler
+import storage
+
+# --- GUILDS ---
+# One installation hosts many households. A guild is a directory holding its
+# member list and templates (guild.json) next to its own shard of everything
+# the family writes: store, event log, task archive, catalog, scheduler
+# watermark, workout checkpoints and imported programs. Loads, saves and lock
+# waits therefore scale with one family, not the installation. The original
+# family lives on in the installation root as the "default" guild.
+GUILD_FILE = "guild.json"
+SAVE_FILE = "save_data.json"
+DB_FILE = "save_data.db"
+CATALOG_FILE = "catalog.json"
+SCHEDULER_FILE = "scheduler.json"  # last rollover day, shared by every app process
+EVENTS_DIR = "events"
+ARCHIVE_DIR = "archive"  # finished one_time_tasks, partitioned like the event log
+PROGRAMS_DIR = "programs"
+CHECKPOINT_DIR = "checkpoints"  # in-progress workout set taps between store commits
+BACKUP_DIR = "backups"  # see backup.py
+RULES_FILE = "rules.json"  # recurring chores, expanded into one_time_tasks by rules.py
+DEFAULT_GUILD = storage.DEFAULT_FAMILY
+MAX_OPEN_GUILDS = 16  # shards kept warm in one process
+IDLE_SECONDS = 30 * 60  # a shard nobody touched for this long is closed on the next open
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "guild"
+
+class Guild:
+    def __init__(self, slug, root, config):
+        self.slug = slug
+        self.root = root
+        self.last_used = time.monotonic()
+        self._token = None
+        self.configure(config)
+
+    def configure(self, config):
+        self.name = config.get("name", self.slug)
+        self.members = dict(config.get("members", {}))  # username -> template name, in login order
+        self.templates = config.get("templates", {})  # template name -> {"shop": ..., "habits": ...}
+        self.skills = config.get("skills", {})
+
+    def config(self):
+        return {"name": self.name, "members": self.members, "templates": self.templates, "skills": self.skills}
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def template_for(self, username):
+        template = self.members.get(username)
+        return template if template in self.templates else next(iter(self.templates), None)
+
+    # Each shard is opened through the usual per-file registries, so sessions of one guild share it.
+    def store(self, kind):
+        if kind == "json":
+            return storage.open_store("json", self.path(SAVE_FILE), family=self.slug)
+        # First launch on SQLite imports the existing save_data.json once.
+        return storage.open_store("sqlite", self.path(DB_FILE), legacy_json=self.path(SAVE_FILE), family=self.slug)
+
+    def events(self):
+        return events.open_log(self.path(EVENTS_DIR))
+
+    def archive(self):
+        return events.open_log(self.path(ARCHIVE_DIR))
+
+    def catalog(self):
+        return catalog.open_catalog(self.path(CATALOG_FILE), {
+            "skills": self.skills,
+            "habits": {name: t["habits"] for name, t in self.templates.items()},
+            "shop": {name: t["shop"] for name, t in self.templates.items()},
+        })
+
+    def rules(self):
+        return rules.open_rulebook(self.path(RULES_FILE))
+
+    def checkpoints(self):
+        return gym.WorkoutCheckpoint(self.path(CHECKPOINT_DIR))
+
+    def scheduler(self, kind, habits_for, new_record=None):
+        return scheduler.open_scheduler(self.store(kind), self.events(), self.path(SCHEDULER_FILE), habits_for,
+                                        self.rules(), new_record, self.archive())
+
+    def close(self):
+        # Drops the shard from every registry and stops its scheduler; the next open reloads from disk.
+        scheduler.close_scheduler(self.path(SCHEDULER_FILE))
+        storage.close_store("json", self.path(SAVE_FILE))
+        storage.close_store("sqlite", self.path(DB_FILE))
+        events.close_log(self.path(EVENTS_DIR))
+        events.close_log(self.path(ARCHIVE_DIR))
+        catalog.close_catalog(self.path(CATALOG_FILE))
+        rules.close_rulebook(self.path(RULES_FILE))
+
+class GuildDirectory:
+    def __init__(self, root, starter, legacy_root=os.curdir, max_open=MAX_OPEN_GUILDS, idle_seconds=IDLE_SECONDS):
+        # `starter` configures the default guild until it saves its own guild.json,
+        # and seeds the templates and skills of every new guild.
+        self.root = root
+        self.starter = starter
+        self.legacy_root = legacy_root
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.evictions = 0
+        self._open = collections.OrderedDict()  # slug -> Guild, least recently used first
+        self._listing = (None, [])
+        self._lock = threading.Lock()
+
+    def guild_root(self, slug):
+        return self.legacy_root if slug == DEFAULT_GUILD else os.path.join(self.root, slug)
+
+    def _read_config(self, slug):
+        try:
+            with open(os.path.join(self.guild_root(slug), GUILD_FILE), "r") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return self.starter if slug == DEFAULT_GUILD else None
+        # A hand-written guild.json may leave out templates or skills; the starter's stand in.
+        return dict(config, templates=config.get("templates") or self.starter["templates"],
+                    skills=config.get("skills") or self.starter["skills"])
+
+    def list(self):
+        # [(slug, name)], default first; re-read only when a guild is added.
+        token = storage.stat_token(self.root)
+        if self._listing[0] != token or token is None:
+            slugs = sorted(s for s in os.listdir(self.root)
+                           if not s.startswith(".") and os.path.exists(os.path.join(self.root, s, GUILD_FILE))) \
+                if os.path.isdir(self.root) else []
+            listing = [(DEFAULT_GUILD, self._read_config(DEFAULT_GUILD).get("name", DEFAULT_GUILD))]
+            listing += [(slug, self._read_config(slug).get("name", slug)) for slug in slugs if slug != DEFAULT_GUILD]
+            self._listing = (token, listing)
+        return self._listing[1]
+
+    def open(self, slug, revalidate=False):
+        # Callers pass revalidate=True once per rerun; every other open is a dict lookup.
+        with self._lock:
+            guild = self._open.get(slug)
+            if guild is None:
+                token = storage.stat_token(os.path.join(self.guild_root(slug), GUILD_FILE))
+                config = self._read_config(slug)
+                if config is None:
+                    raise KeyError(f"No guild named {slug!r}")
+                guild = self._open[slug] = Guild(slug, self.guild_root(slug), config)
+                guild._token = token
+            elif revalidate:
+                # Another process (or an admin in another session) may have edited the member list.
+                token = storage.stat_token(guild.path(GUILD_FILE))
+                if token != guild._token:
+                    guild.configure(self._read_config(slug))
+                    guild._token = token
+            self._open.move_to_end(slug)
+            guild.last_used = time.monotonic()
+            self._evict()
+            return guild
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._open:
+            slug, guild = next(iter(self._open.items()))
+            if len(self._open) <= self.max_open and now - guild.last_used < self.idle_seconds:
+                break
+            del self._open[slug]
+            guild.close()
+            self.evictions += 1
+
+    def create(self, name, members):
+        # Members are {username: template}; templates and skills start as copies of the starter's.
+        slug = base = slugify(name)
+        n = 1
+        while slug == DEFAULT_GUILD or os.path.exists(self.guild_root(slug)):
+            n += 1
+            slug = f"{base}-{n}"
+        # Built aside and renamed in, so list() never sees a guild directory without its guild.json.
+        staging = os.path.join(self.root, f".{slug}.new")
+        os.makedirs(staging, exist_ok=True)
+        storage.atomic_write_json(os.path.join(staging, GUILD_FILE), dict(self.starter, name=name, members=members))
+        os.rename(staging, self.guild_root(slug))
+        return self.open(slug)
+
+    def add_member(self, slug, username, template):
+        guild = self.open(slug)
+        with storage.file_lock(guild.path(GUILD_FILE)):
+            guild.configure(self._read_config(slug))
+            guild.members[username] = template
+            storage.atomic_write_json(guild.path(GUILD_FILE), guild.config())
+        guild._token = storage.stat_token(guild.path(GUILD_FILE))
+        return guild
+
+    def stats(self):
+        return {"open": len(self._open), "evictions": self.evictions}
+
+_directories = {}
+_open_lock = threading.Lock()
+
+def open_directory(root, starter):
+    with _open_lock:
+        key = os.path.abspath(root)
+        if key not in _directories:
+            _directories[key] = GuildDirectory(root, starter)
+        return _directories[key]
@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import storage
+
+# --- EXERCISE HISTORY INDEX ---
+# normalized exercise name -> newest-first list of the last few logged sets,
+# kept in the user's record so "Last:" lookups never scan workout_history.
+EXERCISE_INDEX_DEPTH = 5
+
+def normalize_exercise(name):
+    return " ".join(str(name).lower().split())
+
+def index_session(index, session, depth=EXERCISE_INDEX_DEPTH):
+    for ex in session.get("exercises", []):
+        if not (ex.get("my_weight") or ex.get("my_notes")):
+            continue
+        entries = index.setdefault(normalize_exercise(ex["name"]), [])
+        entries.insert(0, {"date": session.get("date", ""), "weight": ex.get("my_weight", ""), "notes": ex.get("my_notes", "")})
+        del entries[depth:]
+    return index
+
+def build_exercise_index(workout_history, depth=EXERCISE_INDEX_DEPTH):
+    index = {}
+    for session in workout_history:
+        index_session(index, session, depth)
+    return index
+
+def recent_logs(index, exercise_name):
+    return index.get(normalize_exercise(exercise_name), [])
+
+# --- PROGRAM IMPORT ---
+# Coaches' multi-week blocks are streamed in chunks, validated with vectorized
+# pandas ops and written straight to a Parquet file (one row group per chunk).
+# workout_queue then only holds {label: {"program", "week", "day"}} references,
+# and a day's exercises are read from disk when that workout starts.
+PROGRAM_CHUNK_ROWS = 5000
+PROGRAM_COLUMNS = {"week": "week", "day": "day", "order": "order", "exercise": "exercise", "sets": "sets", "reps": "reps",
+                   "notes": "notes", "load%": "load_pct", "load_pct": "load_pct", "load": "load_pct", "rest": "rest"}
+PROGRAM_REQUIRED = ["day", "exercise", "sets", "reps"]
+PROGRAM_SCHEMA = pa.schema([
+    ("week", pa.int32()), ("day", pa.string()), ("order", pa.int32()), ("exercise", pa.string()),
+    ("sets", pa.string()), ("reps", pa.string()), ("notes", pa.string()), ("load_pct", pa.float32()),
+    ("rest", pa.string()),
+])
+
+def _validate_chunk(chunk, first_row, day_counts):
+    # Returns (clean rows, per-row errors). Row numbers match the spreadsheet (header = row 1).
+    rows = pd.Series(range(first_row, first_row + len(chunk)), index=chunk.index)
+    errors = []
+    bad = pd.Series(False, index=chunk.index)
+    for col in PROGRAM_REQUIRED:
+        missing = chunk[col].isna()
+        errors += [{"row": r, "error": f"missing {col}"} for r in rows[missing]]
+        bad |= missing
+    for col, default in (("week", 1), ("order", None), ("load_pct", None)):
+        if col not in chunk:
+            chunk[col] = default
+            continue
+        numeric = pd.to_numeric(chunk[col], errors="coerce")
+        invalid = numeric.isna() & chunk[col].notna()
+        errors += [{"row": r, "error": f"{col} is not a number: {v!r}"} for r, v in zip(rows[invalid], chunk[col][invalid])]
+        bad |= invalid
+        chunk[col] = numeric.fillna(default) if default is not None else numeric
+    clean = chunk[~bad].copy()
+    clean["week"] = clean["week"].astype("int32")
+    clean["day"] = clean["day"].str.strip()
+    # Missing Order continues the running count of its (week, day) across chunks.
+    keys = list(zip(clean["week"], clean["day"]))
+    offsets = pd.Series([day_counts.get(k, 0) for k in keys], index=clean.index)
+    position = clean.groupby(["week", "day"], sort=False).cumcount() + offsets + 1
+    clean["order"] = clean["order"].fillna(position).astype("int32")
+    for key, count in pd.Series(keys).value_counts(sort=False).items():
+        day_counts[key] = day_counts.get(key, 0) + count
+    clean["notes"] = clean["notes"].fillna("") if "notes" in clean else ""
+    clean["rest"] = clean["rest"].fillna("") if "rest" in clean else ""
+    clean["load_pct"] = clean["load_pct"].astype("float32")
+    return clean[PROGRAM_SCHEMA.names], errors
+
+def import_program(source, programs_dir, chunk_rows=PROGRAM_CHUNK_ROWS):
+    # `source` is an uploaded file, an open file or a StringIO. Returns (queue, errors, message).
+    os.makedirs(programs_dir, exist_ok=True)
+    path = os.path.join(programs_dir, f"{uuid.uuid4().hex}.parquet")
+    day_counts, errors, first_row = {}, [], 2
+    writer = None
+    try:
+        for chunk in pd.read_csv(source, dtype=str, chunksize=chunk_rows, skipinitialspace=True):
+            chunk.columns = [PROGRAM_COLUMNS.get(c.strip().lower(), c.strip().lower()) for c in chunk.columns]
+            if writer is None:
+                missing = [c for c in PROGRAM_REQUIRED if c not in chunk.columns]
+                if missing:
+                    return None, [], f"Error: CSV must have columns: Day, Exercise, Sets, Reps (missing {', '.join(missing)})"
+                writer = pq.ParquetWriter(path, PROGRAM_SCHEMA)
+            clean, chunk_errors = _validate_chunk(chunk, first_row, day_counts)
+            errors += chunk_errors
+            first_row += len(chunk)
+            writer.write_table(pa.Table.from_pandas(clean, schema=PROGRAM_SCHEMA, preserve_index=False))
+    except Exception as e:
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.remove(path)
+        return None, errors, f"CSV Error: {e}"
+    finally:
+        if writer is not None:
+            writer.close()
+    if not day_counts:
+        if os.path.exists(path):
+            os.remove(path)
+        return None, errors, "Error: no valid rows found"
+    multi_week = len({week for week, _ in day_counts}) > 1
+    queue = {(f"W{week} · {day}" if multi_week else day): {"program": path, "week": int(week), "day": day} for week, day in day_counts}
+    return queue, errors, f"Loaded {len(queue)} days of missions!"
+
+def load_program_day(entry):
+    # Queue entries are either program references or (older saves) inline exercise lists.
+    if isinstance(entry, list):
+        return entry
+    day = pd.read_parquet(entry["program"], filters=[("week", "==", entry["week"]), ("day", "==", entry["day"])])
+    return [
+        {"name": row.exercise, "sets": row.sets, "reps": row.reps, "trainer_note": row.notes,
+         "load_pct": None if pd.isna(row.load_pct) else float(row.load_pct),
+         "rest": getattr(row, "rest", "") or "",  # programs imported before the Rest column have none
+         "my_weight": "", "my_notes": "", "sets_completed": 0}
+        for row in day.sort_values("order").itertuples(index=False)
+    ]
+
+def release_programs(old_queue, new_queue):
+    # A program file lives as long as some queued day of its owner still points at it.
+    kept = {entry["program"] for entry in new_queue.values() if isinstance(entry, dict)}
+    for path in {entry["program"] for entry in old_queue.values() if isinstance(entry, dict)} - kept:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# --- PLATE SOLVER ---
+# Every load a bar + plate inventory can make is solved once (min-plate bounded
+# knapsack per side) and cached per inventory; lookups are then table reads.
+PLATE_UNIT = 0.25  # lbs; weights are solved in integer quarter-pounds
+DEFAULT_PLATE_SETUP = {"bar": 45, "plates": {"45": 2, "35": 2, "25": 2, "15": 2, "10": 4, "5": 2, "2.5": 2}}
+
+def _units(weight):
+    return int(round(float(weight) / PLATE_UNIT))
+
+class PlateSolver:
+    def __init__(self, bar, plates):
+        self.bar = float(bar)
+        # plates: {plate weight: plates owned}; a side gets one of each pair.
+        pairs = sorted(((float(p), int(n) // 2) for p, n in plates.items() if int(n) >= 2), reverse=True)
+        best = {0: ()}
+        for plate, count in pairs:
+            for _ in range(count):
+                step = _units(plate)
+                for side in sorted(best, reverse=True):
+                    candidate = best[side] + (plate,)
+                    if side + step not in best or len(candidate) < len(best[side + step]):
+                        best[side + step] = candidate
+        self.per_side = best
+        top = max(best)
+        # nearest achievable side load at or below / at or above every unit up to the max
+        self._below, self._above = [0] * (top + 1), [top] * (top + 1)
+        last = 0
+        for u in range(top + 1):
+            last = u if u in best else last
+            self._below[u] = last
+        for u in range(top, -1, -1):
+            last = u if u in best else last
+            self._above[u] = last
+
+    @property
+    def max_load(self):
+        return self.bar + 2 * max(self.per_side) * PLATE_UNIT
+
+    def solve(self, target):
+        # Returns (plates per side or None, nearest load below, nearest load above).
+        side = _units((float(target) - self.bar) / 2)
+        if side < 0:
+            return None, None, self.bar
+        if side > len(self._below) - 1:
+            return None, self.max_load, None
+        if side in self.per_side and abs(self.bar + 2 * side * PLATE_UNIT - float(target)) < PLATE_UNIT:
+            return list(self.per_side[side]), None, None
+        below, above = self._below[side], self._above[side]
+        return None, self.bar + 2 * below * PLATE_UNIT, (self.bar + 2 * above * PLATE_UNIT if above > side else None)
+
+@functools.lru_cache(maxsize=32)
+def _cached_solver(bar, plates):
+    return PlateSolver(bar, dict(plates))
+
+def plate_solver(setup=None):
+    setup = setup or DEFAULT_PLATE_SETUP
+    return _cached_solver(float(setup["bar"]), tuple(sorted((str(p), int(n)) for p, n in setup["plates"].items())))
+
+def format_plates(plates):
+    return " | ".join(f"{p:g}" for p in plates)
+
+# --- WORKOUT CHECKPOINT ---
+# Set taps during a workout only rewrite a small per-user file; the main store is
+# written at exercise boundaries (Next), Claim and Abort. A browser refresh or a
+# server restart resumes from the checkpoint if it belongs to the stored workout.
+class WorkoutCheckpoint:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, username):
+        return os.path.join(self.root, hashlib.sha1(username.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    def save(self, username, workout):
+        os.makedirs(self.root, exist_ok=True)
+        storage.atomic_write_json(self._path(username), workout, durable=False)
+
+    def load(self, username, committed):
+        # Only a checkpoint of the workout the store still has in progress is worth resuming.
+        try:
+            with open(self._path(username), "r") as f:
+                workout = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        same = committed and (workout.get("date"), workout.get("day_name")) == (committed.get("date"), committed.get("day_name"))
+        if not same:
+            self.clear(username)
+            return None
+        return workout
+
+    def clear(self, username):
+        try:
+            os.remove(self._path(username))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,64 @@
+import hashlib
+import time
+
+# --- STACKED INVENTORY ---
+# `inventory` is {item id: {"name": ..., "count": n}}, one stack per shop item,
+# so the Inventory zone and a save cost the same for 1 or 100 banked copies.
+# The id is derived from the shop item's name, so it is the same in every
+# member's record, across reruns and after a price change.
+# `inventory_bought` keeps the purchase times of the copies still held as
+# counted runs, [[epoch seconds, copies], ...] oldest first, so a burst of
+# buys is one run. Redeeming uses up the oldest copies. Copies from before
+# this format have no time and go first.
+# Counts are plain numbers, so two devices buying at once merge to the sum.
+# A stack redeemed to zero is kept (at most one per shop item) rather than
+# deleted: a deleted key would win the merge against another device's buy.
+def item_id(name): return hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+def _runs(bought, iid):
+    runs = bought.setdefault(iid, [])
+    if runs and not isinstance(runs[0], list):  # one time per copy, from before runs
+        flat = sorted(runs); runs.clear()
+        for ts in flat:
+            if runs and runs[-1][0] == ts: runs[-1][1] += 1
+            else: runs.append([ts, 1])
+    return runs
+
+def add(stacks, bought, name, n=1, when=None):
+    iid = item_id(name)
+    stack = stacks.setdefault(iid, {"name": name, "count": 0})
+    stack["count"] += n
+    runs, ts = _runs(bought, iid), int(when or time.time())
+    if runs and runs[-1][0] == ts: runs[-1][1] += n
+    else: runs.append([ts, n])
+    return iid
+
+def redeem(stacks, bought, iid, n=1):
+    # Removes up to n copies; returns (name, copies redeemed).
+    stack = stacks.get(iid)
+    if not stack or not stack["count"]: return None, 0
+    n = min(n, stack["count"])
+    runs = _runs(bought, iid)
+    runs.sort()  # merged appends from two devices may be out of order
+    left = max(0, n - (stack["count"] - sum(c for _, c in runs)))
+    while left and runs:
+        used = min(left, runs[0][1]); left -= used
+        if used == runs[0][1]: runs.pop(0)
+        else: runs[0][1] -= used
+    stack["count"] -= n
+    if not runs: bought.pop(iid, None)
+    return stack["name"], n
+
+def held(stacks): return {iid: stack for iid, stack in stacks.items() if stack["count"] > 0}
+def total(stacks): return sum(stack["count"] for stack in stacks.values())
+def oldest(bought, iid):
+    runs = bought.get(iid)
+    return min(r[0] if isinstance(r, list) else r for r in runs) if runs else None
+
+def from_legacy(items):
+    # ["🥤 Cheat Meal", "🥤 Cheat Meal", ...] -> (stacks, bought); the old list kept no purchase times.
+    stacks = {}
+    for name in items:
+        stack = stacks.setdefault(item_id(name), {"name": name, "count": 0})
+        stack["count"] += 1
+    return stacks, {}
@@ -0,0 +1,141 @@
+import collections
+import contextlib
+import functools
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+# --- HOT-PATH METRICS ---
+# Opt-in (LIFEQUEST_METRICS=1 or the Admin Panel toggle). Timings go into a
+# per-section ring buffer shared by every session in the process; disabled
+# timers cost one attribute check.
+enabled = os.environ.get("LIFEQUEST_METRICS") == "1"
+WINDOW = int(os.environ.get("LIFEQUEST_METRICS_WINDOW", "500"))
+
+_samples = collections.defaultdict(lambda: collections.deque(maxlen=WINDOW))
+_gauges = {}
+_lock = threading.Lock()
+
+def record(section, seconds):
+    with _lock:
+        _samples[section].append((time.time(), seconds))
+
+@contextlib.contextmanager
+def timer(section):
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Also runs when st.rerun() unwinds the section, which is when most saves end.
+        record(section, time.perf_counter() - start)
+
+def timed(section):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(section):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def gauge(name, value, **labels):
+    if enabled:
+        with _lock:
+            _gauges[(name, tuple(sorted(labels.items())))] = value
+
+def deep_sizeof(obj, seen=None):
+    # Rough in-memory size of a session's user data; containers are walked once.
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    return size
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summary():
+    with _lock:
+        snapshot = {section: sorted(s for _, s in samples) for section, samples in _samples.items()}
+    return [{"section": section, "count": len(values), "p50_ms": round(_percentile(values, 0.5) * 1000, 2),
+             "p95_ms": round(_percentile(values, 0.95) * 1000, 2), "max_ms": round(values[-1] * 1000, 2)}
+            for section, values in sorted(snapshot.items()) if values]
+
+def gauges():
+    with _lock:
+        return [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(_gauges.items())]
+
+# --- EXPORT ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_str(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+def prometheus_text():
+    lines = ["# TYPE lifequest_section_seconds summary"]
+    with _lock:
+        snapshot = {section: sorted(s for _, s in samples) for section, samples in _samples.items()}
+        gauge_items = sorted(_gauges.items())
+    for section, values in sorted(snapshot.items()):
+        if not values:
+            continue
+        label = _label_str([("section", section)])
+        for q in (0.5, 0.95):
+            lines.append(f'lifequest_section_seconds{{{label},quantile="{q}"}} {_percentile(values, q):.6f}')
+        lines.append(f"lifequest_section_seconds_sum{{{label}}} {sum(values):.6f}")
+        lines.append(f"lifequest_section_seconds_count{{{label}}} {len(values)}")
+    # One TYPE line per metric name, followed by all of its label sets.
+    by_name = collections.defaultdict(list)
+    for (name, labels), value in gauge_items:
+        by_name[name].append((labels, value))
+    for name, samples in by_name.items():
+        lines.append(f"# TYPE lifequest_{name} gauge")
+        lines += [f"lifequest_{name}{{{_label_str(labels)}}} {value}" if labels else f"lifequest_{name} {value}"
+                  for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+def json_lines():
+    with _lock:
+        rows = [{"ts": ts, "section": section, "ms": round(s * 1000, 3)} for section, samples in _samples.items() for ts, s in samples]
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in sorted(rows, key=lambda r: r["ts"]))
+
+class _ExportHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path.startswith("/samples"):
+            body, content_type = json_lines(), "application/x-ndjson"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+_exporter = None
+
+def start_exporter(port):
+    # GET /metrics (Prometheus text) and /samples (JSON lines) for a home-server scraper.
+    global _exporter
+    if _exporter is None:
+        _exporter = http.server.ThreadingHTTPServer(("0.0.0.0", port), _ExportHandler)
+        threading.Thread(target=_exporter.serve_forever, daemon=True).start()
+    return _exporter
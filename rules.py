@@ -0,0 +1,200 @@
+import copy
+import datetime
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import storage
+import tasks
+
+# --- SCHEDULES ---
+# Cron's date fields, "day-of-month month day-of-week": "*", "1,15", "1-5",
+# "*/2", "10-20/5". Day-of-week runs 0-6 from Sunday (7 is Sunday too). As in
+# cron, when both day fields are restricted a day matching either one counts.
+SCHEDULES = {"Daily": "* * *", "Weekdays": "* * 1-5", "Weekends": "* * 0,6", "Every Saturday": "* * 6", "1st of the month": "1 * *"}
+_RANGES = [(1, 31), (1, 12), (0, 7)]
+WINDOW_DAYS = 7  # tasks exist as one_time_tasks this many days ahead
+
+def _parse_field(field, lo, hi):
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            first, last = lo, hi
+        elif "-" in spec:
+            first, last = (int(x) for x in spec.split("-", 1))
+        else:
+            first = last = int(spec)
+        step = int(step) if step else 1
+        if not (lo <= first <= last <= hi) or step < 1:
+            raise ValueError(f"{part!r} is outside {lo}-{hi}")
+        values.update(range(first, last + 1, step))
+    return values
+
+def parse_schedule(schedule):
+    # -> (days of month, months, weekdays, day-of-month restricted, day-of-week restricted)
+    fields = schedule.split()
+    if len(fields) != 3:
+        raise ValueError("A schedule has three fields: day-of-month month day-of-week")
+    try:
+        doms, months, dows = (_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _RANGES))
+    except ValueError as e:
+        raise ValueError(f"Bad schedule {schedule!r}: {e}") from None
+    if 7 in dows:
+        dows.add(0)
+    return doms, months, dows, fields[0] != "*", fields[2] != "*"
+
+def occurrences(schedule, first, last):
+    doms, months, dows, dom_set, dow_set = parse_schedule(schedule)
+    day = first
+    while day <= last:
+        dom_ok, dow_ok = day.day in doms, day.isoweekday() % 7 in dows
+        if day.month in months and ((dom_ok or dow_ok) if dom_set and dow_set else (dom_ok and dow_ok)):
+            yield day
+        day += datetime.timedelta(days=1)
+
+# --- RULES ---
+# A rule is {"id", "name", "stat", "schedule", "assignees", "rotate", "start",
+# "expanded_through", "turn"}. It is expanded lazily: only days up to today +
+# WINDOW_DAYS become tasks, and `expanded_through` remembers where it stopped.
+# With `rotate`, each occurrence goes to the next assignee in turn; otherwise
+# everyone gets a copy. Task ids are derived from (rule, day, user) and checked
+# against the active list and the archive, so an expansion repeated after a
+# crash adds nothing twice, even for an occurrence finished in between.
+def new_rule(name, stat, schedule, assignees, rotate=False, start=None):
+    parse_schedule(schedule)
+    if not assignees:
+        raise ValueError("A rule needs at least one assignee")
+    return {"id": uuid.uuid4().hex[:12], "name": name, "stat": stat, "schedule": schedule, "assignees": list(assignees),
+            "rotate": rotate, "start": str(start or datetime.date.today()), "expanded_through": None, "turn": 0}
+
+def task_id(rule_id, day, username):
+    return hashlib.sha1(f"{rule_id}|{day}|{username}".encode("utf-8")).hexdigest()[:12]
+
+def expand(rule, through):
+    # Mutates the rule's watermark and turn; returns {username: [new tasks]} for the days it covers.
+    done = rule["expanded_through"]
+    first = max(datetime.date.fromisoformat(rule["start"]),
+                datetime.date.fromisoformat(done) + datetime.timedelta(days=1) if done else datetime.date.min)
+    new_tasks = {}
+    for day in occurrences(rule["schedule"], first, through):
+        if rule["rotate"]:
+            assignees = [rule["assignees"][rule["turn"] % len(rule["assignees"])]]
+            rule["turn"] += 1
+        else:
+            assignees = rule["assignees"]
+        for username in assignees:
+            task = dict(tasks.new_task(rule["name"], rule["stat"], day), id=task_id(rule["id"], day, username), rule=rule["id"])
+            new_tasks.setdefault(username, []).append(task)
+    if through.isoformat() > (done or ""):
+        rule["expanded_through"] = through.isoformat()
+    return new_tasks
+
+def describe(rule):
+    schedule = next((name for name, spec in SCHEDULES.items() if spec == rule["schedule"]), rule["schedule"])
+    return {
+        "Chore": rule["name"],
+        "Stat": rule["stat"],
+        "When": schedule,
+        "Assignees": (" → " if rule["rotate"] else ", ").join(rule["assignees"]),
+        "Planned Through": rule["expanded_through"] or "",
+    }
+
+class RuleBook:
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._token = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        # {rule id: rule}; read-only, revalidated with a stat() like the catalog.
+        with self._lock:
+            token = storage.stat_token(self.path)
+            if self._data is None or token != self._token:
+                self._data = {}
+                if token is not None:
+                    with open(self.path, "r") as f:
+                        self._data = json.load(f)
+                self._token = token
+            return self._data
+
+    def _commit(self, data):
+        storage.atomic_write_json(self.path, data)
+        self._data, self._token = data, storage.stat_token(self.path)
+
+    def expand(self, store, today=None, window=WINDOW_DAYS, only=None, new_record=None, archive=None):
+        # Materializes every rule (or just `only`) through today + window: one batched save for all
+        # affected members, then the new watermarks. Returns the number of tasks added.
+        # new_record(username) starts a record for an assignee who has none yet; `archive` is the
+        # finished-task log, so occurrences already done are not planned again.
+        through = (today or datetime.date.today()) + datetime.timedelta(days=window)
+        with self._lock, storage.file_lock(self.path):
+            self._data = None
+            data = copy.deepcopy(self.load())
+            current = store.load_all()
+            new_tasks = {}
+            for rule in data.values():
+                if only is not None and rule["id"] not in only:
+                    continue
+                if new_record is None and any(username not in current for username in rule["assignees"]):
+                    continue  # no way to start the missing record; the rule waits, watermark and turn included
+                for username, user_tasks in expand(rule, through).items():
+                    new_tasks.setdefault(username, []).extend(user_tasks)
+            updates, bases, added = {}, {}, 0
+            for username, user_tasks in new_tasks.items():
+                base = current.get(username) or new_record(username)
+                record = dict(base, **{storage.TASKS_KEY: list(base.get(storage.TASKS_KEY, []))})
+                have = {t["id"] for t in record[storage.TASKS_KEY]}
+                if archive is not None:
+                    # A planned occurrence can only have been finished once it was within the window.
+                    since = min(datetime.date.fromisoformat(t["due_date"]) for t in user_tasks) - datetime.timedelta(days=window)
+                    have |= {entry.get("id") for entry in archive.iter_events(username, start=since)}
+                for task in user_tasks:
+                    if task["id"] not in have:
+                        tasks.add_task(record[storage.TASKS_KEY], task)
+                        added += 1
+                updates[username], bases[username] = record, base
+            if added:
+                store.save_many(updates, bases)
+            if data != self.load():
+                self._commit(data)
+            return added
+
+    def add(self, rule, store, today=None, new_record=None, archive=None):
+        with self._lock, storage.file_lock(self.path):
+            self._data = None
+            self._commit(dict(self.load(), **{rule["id"]: rule}))
+        return self.expand(store, today, only={rule["id"]}, new_record=new_record, archive=archive)
+
+    def remove(self, rule_id, store, today=None):
+        # Drops the rule and the tasks it planned after today; today's and overdue ones stay.
+        today = (today or datetime.date.today()).isoformat()
+        with self._lock, storage.file_lock(self.path):
+            self._data = None
+            data = {k: v for k, v in self.load().items() if k != rule_id}
+            current = store.load_all()
+            updates, bases = {}, {}
+            for username, record in current.items():
+                kept = [t for t in record.get(storage.TASKS_KEY, []) if t.get("rule") != rule_id or t.get("due_date", "") <= today]
+                if len(kept) != len(record.get(storage.TASKS_KEY, [])):
+                    updates[username], bases[username] = dict(record, **{storage.TASKS_KEY: kept}), record
+            if updates:
+                store.save_many(updates, bases)
+            self._commit(data)
+
+_rulebooks = {}
+_open_lock = threading.Lock()
+
+def open_rulebook(path):
+    with _open_lock:
+        key = os.path.abspath(path)
+        if key not in _rulebooks:
+            _rulebooks[key] = RuleBook(path)
+        return _rulebooks[key]
+
+def close_rulebook(path):
+    with _open_lock:
+        return _rulebooks.pop(os.path.abspath(path), None)
@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import sys
+import threading
+
+import events
+import metrics
+import storage
+
+# --- DAILY ROLLOVER ---
+# Each member's `last_login` is the first day not yet judged. A rollover judges
+# every day from there up to yesterday, so three skipped days cost three days
+# of penalties, and then moves the watermark to today. Habits need no reset of
+# their own: a habit counts as done only while its last-done date is today.
+PENALTY_PER_HABIT = 10
+CHECK_EVERY = 60  # seconds between watermark checks
+
+def roll_over(record, habits, today):
+    # Mutates `record` (attributes, one_time_tasks, last_login); returns the events to log.
+    start = datetime.date.fromisoformat(record.get("last_login") or today.isoformat())
+    new_events = []
+    for offset in range((today - start).days):
+        day = start + datetime.timedelta(days=offset)
+        missed = [h for h, data in habits.items() if not data[1] or data[1] < day.isoformat()]
+        if missed:
+            damage = len(missed) * PENALTY_PER_HABIT
+            record["attributes"]["HP"] = max(1, record["attributes"]["HP"] - damage)
+            new_events.append(events.make_event("penalty", f"Missed {len(missed)} Daily Quests", note=f"-{damage} HP",
+                                                when=datetime.datetime.combine(day, datetime.time(23, 59))))
+    for task in record.get(storage.TASKS_KEY, []):
+        due = task.get("due_date")
+        if not task["done"] and not task.get("overdue") and due and due < today.isoformat():
+            task["overdue"] = True
+            new_events.append(events.make_event("penalty", task["name"], note="OVERDUE",
+                                                when=datetime.datetime.combine(today, datetime.time(0, 0))))
+    record["last_login"] = today.isoformat()
+    return new_events
+
+class Scheduler:
+    def __init__(self, store, log, path, habits_for, rules=None, new_record=None, archive=None):
+        # habits_for(username, record) -> that member's merged habits view.
+        # rules: a rules.RuleBook whose window moves forward a day with each rollover; new_record
+        # and archive are handed to its expansion (see RuleBook.expand).
+        self.store = store
+        self.log = log
+        self.path = path
+        self.habits_for = habits_for
+        self.rules = rules
+        self.new_record = new_record
+        self.archive = archive
+        self.last_run = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watermark(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("last_run")
+        except FileNotFoundError:
+            return None
+
+    def run_once(self, today=None):
+        # One pass over the whole guild, committed as a single batch. Returns members changed.
+        today = today or datetime.date.today()
+        if self.last_run == today.isoformat():
+            return 0
+        # Keeps the daily_penalty series from when the rollover ran inside a request.
+        with metrics.timer("daily_penalty"), storage.file_lock(self.path):
+            if self.watermark() == today.isoformat():
+                self.last_run = today.isoformat()
+                return 0
+            updates, bases, new_events = {}, {}, {}
+            for username, current in self.store.load_all().items():
+                # Only the fields a rollover touches are copied; the rest stay shared with the cache.
+                record = dict(current, attributes=dict(current.get("attributes", {})),
+                              **{storage.TASKS_KEY: [dict(t) for t in current.get(storage.TASKS_KEY, [])]})
+                new_events[username] = roll_over(record, self.habits_for(username, record), today)
+                if record != current:
+                    updates[username], bases[username] = record, current
+            if updates:
+                self.store.save_many(updates, bases)
+            for username, user_events in new_events.items():
+                if user_events:
+                    self.log.extend(username, user_events)
+            if self.rules:
+                self.rules.expand(self.store, today, new_record=self.new_record, archive=self.archive)
+            storage.atomic_write_json(self.path, {"last_run": today.isoformat()})
+            self.last_run = today.isoformat()
+            return len(updates)
+
+    def _loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:  # keep the worker alive; the next tick retries
+                print(f"scheduler: rollover failed: {e!r}", file=sys.stderr)
+            self._stop.wait(interval)
+
+    def start(self, interval=CHECK_EVERY):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True, name="lifequest-scheduler")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # A stopped scheduler misses nothing: the next one catches up from each member's last_login.
+        self._stop.set()
+
+_schedulers = {}
+_open_lock = threading.Lock()
+
+def open_scheduler(store, log, path, habits_for, rules=None, new_record=None, archive=None):
+    with _open_lock:
+        key = os.path.abspath(path)
+        if key not in _schedulers:
+            _schedulers[key] = Scheduler(store, log, path, habits_for, rules, new_record, archive)
+        return _schedulers[key]
+
+def close_scheduler(path):
+    with _open_lock:
+        sched = _schedulers.pop(os.path.abspath(path), None)
+    if sched:
+        sched.stop()
+    return sched
@@ -0,0 +1,659 @@
+import bisect
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+# --- RECORD LAYOUT ---
+# Collections that grow forever get their own table (one row per entry) so a
+# save only appends the new entries instead of rewriting the user's lifetime.
+HISTORY_KEY = "completed_history"
+TASKS_KEY = "one_time_tasks"
+WORKOUTS_KEY = "workout_history"
+WEIGHT_KEY = "weight_log"
+SPLIT_KEYS = (HISTORY_KEY, TASKS_KEY, WORKOUTS_KEY, WEIGHT_KEY)
+VERSION_KEY = "_version"  # bumped on every committed save, used for compare-and-swap
+_MISSING = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS user_fields (
+    username TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (username, field)
+);
+CREATE TABLE IF NOT EXISTS history (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+);
+CREATE TABLE IF NOT EXISTS workouts (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    session TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+);
+CREATE TABLE IF NOT EXISTS weigh_ins (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (username, seq)
+);
+"""
+
+def stat_token(path):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+# --- FILE LOCKING ---
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+_thread_locks = {}  # abspath -> threading.Lock, the fallback when fcntl is missing
+_thread_locks_guard = threading.Lock()
+
+@contextlib.contextmanager
+def file_lock(path):
+    # Advisory lock on a sidecar file, held only for the read-check-write window.
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        else:
+            with _thread_locks_guard:
+                lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+            with lock:
+                yield
+
+def atomic_write_json(path, data, durable=True):
+    # A crash mid-dump leaves the old file intact: readers only ever see a complete file.
+    # durable=False skips the fsync: still atomic across a process crash, not a power cut.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".save-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# --- RECORD DELTAS ---
+# A delta is a list of ops against one user's record: ["set", path, value],
+# ["extend", path, items] (append-only lists) or ["del", path]. Saves ship the
+# delta, so a habit check-off costs a few bytes no matter how long the history is.
+def dirty_fields(base, record):
+    return [k for k, v in record.items() if base.get(k, _MISSING) != v] + [k for k in base if k not in record]
+
+def diff_record(old, new, path=()):
+    ops = []
+    for key, value in new.items():
+        old_value = old.get(key, _MISSING)
+        if old_value == value:
+            continue
+        key_path = list(path) + [key]
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            ops += diff_record(old_value, value, key_path)
+        elif isinstance(value, list) and isinstance(old_value, list) and value[:len(old_value)] == old_value:
+            ops.append(["extend", key_path, value[len(old_value):]])
+        elif isinstance(value, list) and isinstance(old_value, list) and len(value) == len(old_value) and value[:-1] == old_value[:-1]:
+            # Only the newest entry changed (a same-day weigh-in): ship just that element.
+            ops.append(["set", key_path + [len(value) - 1], value[-1]])
+        else:
+            ops.append(["set", key_path, value])
+    ops += [["del", list(path) + [key]] for key in old if key not in new]
+    return ops
+
+def first_changed_row(ops, key, length):
+    # Lowest list index under `key` that a delta can have changed: an extend starts at the old
+    # tail, a rewritten element at its index; anything else (a whole new list) at 0.
+    start = length
+    for op in ops:
+        if op[1][0] != key:
+            continue
+        if op[0] == "extend":
+            start = min(start, length - len(op[2]))
+        elif op[0] == "set" and isinstance(op[1][-1], int):
+            start = min(start, op[1][-1])
+        else:
+            return 0
+    return start
+
+def apply_ops(record, ops):
+    for op in ops:
+        *parents, leaf = op[1]
+        target = record
+        for key in parents:
+            target = target[key] if isinstance(key, int) else target.setdefault(key, {})
+        if op[0] == "set":
+            target[leaf] = op[2]
+        elif op[0] == "extend":
+            target.setdefault(leaf, []).extend(op[2])
+        else:
+            target.pop(leaf, None)
+    return record
+
+# --- LEADERBOARD VIEW ---
+# Materialized on save instead of summing every user's xp on each Dashboard visit.
+# Entries are grouped by family so one server can rank many households.
+LEADERBOARD_FIELDS = {"xp", "attributes"}
+DEFAULT_FAMILY = "default"
+
+def leaderboard_entry(username, user_data, family):
+    xp = dict(user_data.get("xp", {}))
+    gold = user_data.get("attributes", {}).get("Gold", 0)
+    return {"user": username, "family": family, "total_xp": sum(xp.values()), "gold": gold, "xp": xp}
+
+class Leaderboard:
+    def __init__(self):
+        self._entries = {}
+        self._order = {}  # family -> sorted [(-total_xp, username)]
+
+    def update(self, entry):
+        old = self._entries.get(entry["user"])
+        if old == entry:
+            return False
+        if old:
+            order = self._order[old["family"]]
+            del order[bisect.bisect_left(order, (-old["total_xp"], old["user"]))]
+        bisect.insort(self._order.setdefault(entry["family"], []), (-entry["total_xp"], entry["user"]))
+        self._entries[entry["user"]] = entry
+        return True
+
+    def top(self, n=None, family=None):
+        if family is None:
+            order = sorted(key for keys in self._order.values() for key in keys)
+        else:
+            order = self._order.get(family, [])
+        return [self._entries[username] for _, username in order[:n]]
+
+# --- JSON BACKEND (snapshot file + append-only journal) ---
+JOURNAL_COMPACT_AFTER = 500  # journal records before they are folded into the snapshot
+
+class JsonBackend:
+    def __init__(self, path, family=DEFAULT_FAMILY):
+        self.path = path
+        self.family = family
+        self.journal_path = path + ".journal"
+        self._journal_records = None
+        self._compacting = threading.Lock()
+
+    def change_token(self):
+        return (stat_token(self.path), stat_token(self.journal_path))
+
+    def locked(self):
+        return file_lock(self.path)
+
+    def load_all(self):
+        all_data = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                all_data = json.load(f)
+        self._journal_records = self._replay_journal(all_data)
+        return all_data
+
+    def _replay_journal(self, all_data):
+        count = 0
+        if not os.path.exists(self.journal_path):
+            return count
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn tail from a crash mid-append
+                count += 1
+                record = all_data.setdefault(entry["user"], {})
+                # Entries already folded into the snapshot (crash during compaction) are skipped.
+                if entry["version"] > record.get(VERSION_KEY, 0):
+                    apply_ops(record, entry["ops"])
+                    record[VERSION_KEY] = entry["version"]
+        return count
+
+    def commit(self, updates, expected, snapshot, deltas=None):
+        # Caller holds locked() and passes a snapshot revalidated inside it.
+        for username, version in expected.items():
+            if snapshot.get(username, {}).get(VERSION_KEY, 0) != version:
+                return False
+        all_data = dict(snapshot)
+        all_data.update(updates)
+        if deltas is None:
+            atomic_write_json(self.path, all_data)
+            return True
+        lines = "".join(
+            json.dumps({"user": username, "version": updates[username][VERSION_KEY], "ops": ops}) + "\n"
+            for username, ops in deltas.items()
+        )
+        with open(self.journal_path, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_records = (self._journal_records or 0) + len(deltas)
+        if self._journal_records >= JOURNAL_COMPACT_AFTER:
+            threading.Thread(target=self.compact, daemon=True).start()
+        return True
+
+    def compact(self):
+        # Fold the journal into a fresh snapshot; runs off the request thread.
+        if not self._compacting.acquire(blocking=False):
+            return
+        try:
+            with self.locked():
+                all_data = self.load_all()
+                atomic_write_json(self.path, all_data)
+                open(self.journal_path, "w").close()
+                self._journal_records = 0
+        finally:
+            self._compacting.release()
+
+# --- SQLITE BACKEND (WAL, per-user rows) ---
+class SqliteBackend:
+    def __init__(self, path, family=DEFAULT_FAMILY):
+        self.path = path
+        self.family = family
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def change_token(self):
+        # Commits land in the -wal file and checkpoints in the main file, so stats catch both.
+        return (stat_token(self.path), stat_token(self.path + "-wal"))
+
+    def locked(self):
+        return file_lock(self.path)
+
+    def _connect(self):
+        # Streamlit serves each session from its own thread; sqlite connections can't be shared.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_all(self):
+        conn = self._connect()
+        all_data = {}
+        for username, version in conn.execute("SELECT username, version FROM users"):
+            all_data[username] = {HISTORY_KEY: [], TASKS_KEY: [], WORKOUTS_KEY: [], WEIGHT_KEY: {"dates": [], "weights": []}}
+            all_data[username][VERSION_KEY] = version
+        for username, field, value in conn.execute("SELECT username, field, value FROM user_fields"):
+            all_data[username][field] = json.loads(value)
+        for username, entry in conn.execute("SELECT username, entry FROM history ORDER BY username, seq"):
+            all_data[username][HISTORY_KEY].append(entry)
+        for username, task in conn.execute("SELECT username, task FROM tasks ORDER BY username, seq"):
+            all_data[username][TASKS_KEY].append(json.loads(task))
+        for username, session in conn.execute("SELECT username, session FROM workouts ORDER BY username, seq"):
+            all_data[username][WORKOUTS_KEY].append(json.loads(session))
+        for username, date, weight in conn.execute("SELECT username, date, weight FROM weigh_ins ORDER BY username, seq"):
+            all_data[username][WEIGHT_KEY]["dates"].append(date)
+            all_data[username][WEIGHT_KEY]["weights"].append(weight)
+        return all_data
+
+    def commit(self, updates, expected, snapshot, deltas=None):
+        # Compare-and-swap on users.version; the whole batch rolls back if any user moved on.
+        # With deltas, only the top-level fields they touch are rewritten.
+        conn = self._connect()
+        try:
+            with conn:
+                for username, user_data in updates.items():
+                    ops = deltas[username] if deltas is not None else None
+                    fields = {op[1][0] for op in ops} if ops is not None else set(user_data)
+                    if not self._write_user(conn, username, user_data, expected.get(username), fields, ops):
+                        raise _VersionConflict()
+        except _VersionConflict:
+            return False
+        return True
+
+    def _write_user(self, conn, username, user_data, expected_version, fields, ops=None):
+        version = user_data.get(VERSION_KEY, 0)
+        if expected_version is None:
+            conn.execute("INSERT OR REPLACE INTO users (username, version) VALUES (?, ?)", (username, version))
+        elif conn.execute("UPDATE users SET version = ? WHERE username = ? AND version = ?", (version, username, expected_version)).rowcount == 0:
+            exists = conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+            if exists or expected_version != 0:
+                return False
+            conn.execute("INSERT INTO users (username, version) VALUES (?, ?)", (username, version))
+        conn.executemany(
+            "INSERT OR REPLACE INTO user_fields (username, field, value) VALUES (?, ?, ?)",
+            [(username, k, json.dumps(user_data[k])) for k in fields if k in user_data and k not in SPLIT_KEYS and k != VERSION_KEY],
+        )
+        conn.executemany(
+            "DELETE FROM user_fields WHERE username = ? AND field = ?",
+            [(username, k) for k in fields if k not in user_data],
+        )
+        if HISTORY_KEY in fields:
+            self._append_rows(conn, "history", "entry", username, user_data.get(HISTORY_KEY, []), ops, HISTORY_KEY)
+        if WORKOUTS_KEY in fields:
+            self._append_rows(conn, "workouts", "session", username, [json.dumps(s) for s in user_data.get(WORKOUTS_KEY, [])], ops, WORKOUTS_KEY)
+        if WEIGHT_KEY in fields:
+            weight_log = user_data.get(WEIGHT_KEY, {"dates": [], "weights": []})
+            self._append_rows(conn, "weigh_ins", ("date", "weight"), username, list(zip(weight_log["dates"], weight_log["weights"])), ops, WEIGHT_KEY)
+        if TASKS_KEY in fields:
+            self._sync_rows(conn, "tasks", "task", username, [json.dumps(t) for t in user_data.get(TASKS_KEY, [])])
+        return True
+
+    def _append_rows(self, conn, table, columns, username, rows, ops=None, key=None):
+        # History, workouts and weigh-ins mostly grow at the tail, so rows are rewritten only from
+        # the first index the delta touched; a back-dated weigh-in rewrites from its own position.
+        if isinstance(columns, str):
+            columns = (columns,)
+            rows = [(r,) for r in rows]
+        stored = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE username = ?", (username,)).fetchone()[0]
+        if len(rows) < stored:
+            conn.execute(f"DELETE FROM {table} WHERE username = ? AND seq >= ?", (username, len(rows)))
+        start = min(stored, first_changed_row(ops, key, len(rows))) if ops is not None else 0
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} (username, seq, {', '.join(columns)}) VALUES (?, ?, {placeholders})",
+            [(username, seq) + tuple(row) for seq, row in enumerate(rows[start:], start)],
+        )
+
+    def _sync_rows(self, conn, table, column, username, rows):
+        # Tasks are edited in place (done flag), so diff them row by row.
+        stored = dict(conn.execute(f"SELECT seq, {column} FROM {table} WHERE username = ?", (username,)))
+        conn.execute(f"DELETE FROM {table} WHERE username = ? AND seq >= ?", (username, len(rows)))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} (username, seq, {column}) VALUES (?, ?, ?)",
+            [(username, seq, row) for seq, row in enumerate(rows) if stored.get(seq) != row],
+        )
+
+class _VersionConflict(Exception):
+    pass
+
+# --- CONFLICT MERGE ---
+# Three-way merge of one user's record: `base` is what the writer loaded, `mine`
+# is what it wants to save, `theirs` is what another device committed meanwhile.
+
+def merge_records(base, mine, theirs):
+    if mine == base:
+        return theirs
+    if theirs == base:
+        return mine
+    if isinstance(base, dict) and isinstance(mine, dict) and isinstance(theirs, dict):
+        merged = {}
+        for key in list(theirs) + [k for k in mine if k not in theirs]:
+            value = merge_records(base.get(key, _MISSING), mine.get(key, _MISSING), theirs.get(key, _MISSING))
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+    if isinstance(base, list) and isinstance(mine, list) and isinstance(theirs, list):
+        if _has_ids(base) and _has_ids(mine) and _has_ids(theirs):
+            # Entries with stable ids (tasks) merge by id, so a removal or insert doesn't shift the rest.
+            by_id = [{e["id"]: e for e in side} for side in (base, mine, theirs)]
+            merged = merge_records(*by_id)
+            order = [e["id"] for e in theirs] + [e["id"] for e in mine if e["id"] not in by_id[2]]
+            return [merged[i] for i in order if i in merged]
+        if len(mine) >= len(base) and len(theirs) >= len(base):
+            # In-place edits merge element-wise; both sides' appends are kept.
+            head = [merge_records(b, m, t) for b, m, t in zip(base, mine, theirs)]
+            return head + theirs[len(base):] + mine[len(base):]
+        return mine
+    if _is_number(base) and _is_number(mine) and _is_number(theirs):
+        # Counters (Gold, XP, HP): apply both deltas.
+        return theirs + (mine - base)
+    return mine
+
+def _has_ids(entries):
+    return all(isinstance(e, dict) and "id" in e for e in entries)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# --- PROCESS-WIDE CACHE ---
+# Every rerun of every session reads through one parsed copy of the guild. It is
+# revalidated with a stat() of the backend's files, so a rerun that changes
+# nothing never reads the disk, and a write from another process is picked up.
+# Callers must treat load_all() results as read-only and deepcopy what they edit.
+MAX_SAVE_ATTEMPTS = 5
+
+class CachedStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.leaderboard = Leaderboard()
+        self._data = None
+        self._token = None
+        self._lock = threading.RLock()
+
+    def load_all(self):
+        with self._lock:
+            token = self.backend.change_token()
+            if self._data is not None and token == self._token:
+                self.hits += 1
+                return self._data
+            self.misses += 1
+            self._data = self.backend.load_all()
+            self.leaderboard = Leaderboard()
+            for username, user_data in self._data.items():
+                self.leaderboard.update(leaderboard_entry(username, user_data, self.backend.family))
+            self._token = token
+            self.version += 1
+            return self._data
+
+    def load_user(self, username, skip=()):
+        # `skip` leaves heavy fields in the cache for LazyField to hand out on demand.
+        user_data = self.load_all().get(username)
+        if user_data is None:
+            return None
+        return {k: copy.deepcopy(v) for k, v in user_data.items() if k not in skip}
+
+    def save_user(self, username, user_data, base=None):
+        return self.save_many({username: user_data}, {username: base})[username]
+
+    def save_many(self, updates, bases=None):
+        # Optimistic concurrency: each record carries the _version it was loaded at.
+        # If another writer committed first, merge against `base` and swap again.
+        # Returns the committed records, which callers should adopt as their new state.
+        bases = bases or {}
+        with self._lock, self.backend.locked():
+            for _ in range(MAX_SAVE_ATTEMPTS):
+                snapshot = self.load_all()
+                results, records, expected, deltas = {}, {}, {}, {}
+                for username, user_data in updates.items():
+                    current = snapshot.get(username)
+                    user_data, base = resolve_lazy(user_data, bases.get(username), current)
+                    current_version = current.get(VERSION_KEY, 0) if current else 0
+                    if current is not None and user_data.get(VERSION_KEY, 0) != current_version:
+                        self.conflicts += 1
+                        user_data = merge_records(base if base is not None else current, user_data, current)
+                    ops = [op for op in diff_record(current or {}, user_data) if op[1] != [VERSION_KEY]]
+                    if not ops and current is not None:
+                        results[username] = dict(user_data, **{VERSION_KEY: current_version})
+                        continue
+                    records[username] = results[username] = dict(user_data, **{VERSION_KEY: current_version + 1})
+                    expected[username] = current_version
+                    deltas[username] = ops
+                if not records or self.backend.commit(records, expected, snapshot, deltas):
+                    break
+                self._data = None
+            else:
+                raise RuntimeError(f"Save failed after {MAX_SAVE_ATTEMPTS} conflicting attempts")
+            if records:
+                # We hold the lock, so nobody else wrote: patch the cache instead of re-reading.
+                # Readers may be iterating the old dicts, so replace rather than mutate them.
+                self._data = dict(self._data)
+                for username, record in records.items():
+                    cached = dict(self._data.get(username, {}))
+                    fields = {op[1][0] for op in deltas[username]}
+                    for field in fields:
+                        if field in record:
+                            cached[field] = copy.deepcopy(record[field])
+                        else:
+                            cached.pop(field, None)
+                    cached[VERSION_KEY] = record[VERSION_KEY]
+                    self._data[username] = cached
+                    if fields & LEADERBOARD_FIELDS:
+                        self.leaderboard.update(leaderboard_entry(username, cached, self.backend.family))
+                self._token = self.backend.change_token()
+                self.version += 1
+            return results
+
+    def top(self, n=None, family=None):
+        self.load_all()  # revalidate; the view is rebuilt with the cache
+        return self.leaderboard.top(n, family)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "version": self.version, "conflicts": self.conflicts}
+
+# --- LAZY FIELDS ---
+# A session keeps a LazyField in place of each heavy collection. The value is
+# copied out of the shared cache on first use and dropped again once saved or
+# released, so per-session memory does not grow with a user's history. Appends
+# to a list that was never loaded are queued and shipped as an extend on save.
+class LazyField:
+    def __init__(self, store, username, key, default):
+        self.store = store
+        self.username = username
+        self.key = key
+        self.default = default
+        self.pending = []
+        self._value = self._base = _MISSING
+
+    def committed(self):
+        # Read-only view of the cached value; never mutate it.
+        record = self.store.load_all().get(self.username) or {}
+        return record.get(self.key, self.default)
+
+    @property
+    def loaded(self):
+        return self._value is not _MISSING
+
+    @property
+    def value(self):
+        if self._value is _MISSING:
+            self._base = copy.deepcopy(self.committed())
+            self._value = copy.deepcopy(self._base)
+            if self.pending:
+                self._value.extend(self.pending)
+                self.pending = []
+        return self._value
+
+    @property
+    def dirty(self):
+        return bool(self.pending) or (self.loaded and self._value != self._base)
+
+    def append(self, item):
+        if self.loaded:
+            self._value.append(item)
+        else:
+            self.pending.append(item)
+
+    def resolve(self, current):
+        # (value to save, base it was derived from) against the committed value.
+        if self.loaded:
+            return self._value, self._base
+        if self.pending:
+            return list(current) + self.pending, current
+        return current, current
+
+    def release(self):
+        if self.loaded and not self.dirty:
+            self._value = self._base = _MISSING
+
+    def reset(self):
+        self.pending = []
+        self._value = self._base = _MISSING
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.value, name)
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __setitem__(self, key, item):
+        self.value[key] = item
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value) if self.loaded else len(self.committed()) + len(self.pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __repr__(self):
+        return f"LazyField({self.username!r}, {self.key!r}, loaded={self.loaded})"
+
+def resolve_lazy(record, base, current):
+    # Swaps LazyFields for plain values before a save. An untouched field resolves
+    # to the committed value itself, so it diffs to nothing and is never copied.
+    lazy = {k: v for k, v in record.items() if isinstance(v, LazyField)}
+    if not lazy:
+        return record, base
+    record = dict(record)
+    base = dict(base) if base is not None else None
+    for key, field in lazy.items():
+        record[key], field_base = field.resolve((current or {}).get(key, field.default))
+        if base is not None:
+            base[key] = field_base
+    return record, base
+
+# --- IMPORT ---
+def import_json(json_path, db_path):
+    data = JsonBackend(json_path).load_all()
+    SqliteBackend(db_path).commit(data, {}, {})
+    return len(data)
+
+# --- STORE REGISTRY ---
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend}
+_open_stores = {}
+_open_lock = threading.Lock()
+
+def open_store(kind, path, legacy_json=None, family=DEFAULT_FAMILY):
+    # Module state survives Streamlit reruns, so every session shares one store per file.
+    with _open_lock:
+        key = (kind, os.path.abspath(path))
+        if key not in _open_stores:
+            if kind == "sqlite" and legacy_json and not os.path.exists(path) and os.path.exists(legacy_json):
+                import_json(legacy_json, path)
+            _open_stores[key] = CachedStore(BACKENDS[kind](path, family))
+        return _open_stores[key]
+
+def close_store(kind, path):
+    # The next open_store re-reads the file; sessions still holding the old store keep working.
+    with _open_lock:
+        return _open_stores.pop((kind, os.path.abspath(path)), None)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "import":
+        sys.exit("usage: python storage.py import save_data.json save_data.db")
+    print(f"Imported {import_json(sys.argv[2], sys.argv[3])} users into {sys.argv[3]}")
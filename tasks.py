@@ -0,0 +1,61 @@
+import bisect
+import datetime
+import uuid
+
+# --- ACTIVE TASKS ---
+# one_time_tasks only holds unfinished tasks. Each has a stable id (used for
+# widget keys and for merging concurrent saves) and the list is kept in
+# due-date order, so the Quest Board splits it into overdue / due today /
+# upcoming with two bisects. ISO dates compare as strings; nothing is parsed.
+def new_task(name, stat, due_date):
+    return {"id": uuid.uuid4().hex[:12], "name": name, "stat": stat, "done": False, "due_date": str(due_date)}
+
+def _due(task, today):
+    return task.get("due_date") or today
+
+def add_task(tasks, task):
+    today = datetime.date.today().isoformat()
+    tasks.insert(bisect.bisect_right([_due(t, today) for t in tasks], _due(task, today)), task)
+
+def due_groups(tasks, today):
+    # Returns (overdue, due_today, upcoming); the sort is linear on an already ordered list.
+    ordered = sorted(tasks, key=lambda t: _due(t, today))
+    keys = [_due(t, today) for t in ordered]
+    lo, hi = bisect.bisect_left(keys, today), bisect.bisect_right(keys, today)
+    return ordered[:lo], ordered[lo:hi], ordered[hi:]
+
+def complete(tasks, task_id):
+    for i, task in enumerate(tasks):
+        if task["id"] == task_id:
+            return tasks.pop(i)
+    return None
+
+# --- ARCHIVE ---
+# Finished tasks leave the record for a time-partitioned log (events.EventLog
+# under its own root), which the Admin Panel pages through newest first.
+def archive_entry(task, gold=0, note="", when=None):
+    when = when or datetime.datetime.now()
+    return dict(task, done=True, ts=when.isoformat(timespec="seconds"), kind="task", gold=gold, note=note)
+
+def split_legacy(tasks):
+    # Older saves kept finished tasks in the list and had no ids. Returns (active, archive entries).
+    active, archived = [], []
+    for task in tasks:
+        task = dict(task, id=task.get("id") or uuid.uuid4().hex[:12])
+        if task.get("done"):
+            due = datetime.datetime.strptime(task.get("due_date") or "1970-01-01", "%Y-%m-%d")
+            archived.append(archive_entry(task, when=due))
+        else:
+            active.append(task)
+    today = datetime.date.today().isoformat()
+    return sorted(active, key=lambda t: _due(t, today)), sorted(archived, key=lambda e: e["ts"])
+
+def describe(entry):
+    return {
+        "Task": entry["name"],
+        "Stat": entry.get("stat", ""),
+        "Due": entry.get("due_date", ""),
+        "Completed": entry["ts"].replace("T", " ")[:16],
+        "Gold": entry.get("gold", 0),
+        "Status": entry.get("note", ""),
+    }